@@ -1,171 +1,254 @@
 from fastapi import FastAPI, Response
+from fastapi.responses import ORJSONResponse
 import uvicorn
+import ijson
+import orjson
+from pydantic import BaseModel
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
 import sys
 import os
-from typing import Dict, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from shared.config import AppConfig
-from shared.models import OrderData, FileData, ServiceResponse
+from shared.config import AppConfig, get_config, get_env_bool
+from shared.models import OrderData, FileData, EmailBatchCommon, EmailBatchOp, EmailBatchPayload
 from shared.logging_config import LoggerSetup
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 class OrderOrchestrator:
     def __init__(self, config: AppConfig):
         self.config = config
         self.setup_logging()
+        self.setup_session()
+        
+        # Downstream services as (name, base_url) pairs; fixed for the process lifetime
+        self._services: Tuple[Tuple[str, str], ...] = (
+            ("order-service", config.services.order_service_url),
+            ("file-service", config.services.file_service_url),
+            ("email-service", config.services.email_service_url)
+        )
+        
+        # Endpoint URLs never change at runtime
+        self._url_orders_check = f"{config.services.order_service_url}/orders/check"
+        self._url_orders_details = f"{config.services.order_service_url}/orders/details"
+        self._url_orders_status = f"{config.services.order_service_url}/orders/status"
+        self._url_files_check = f"{config.services.file_service_url}/files/check"
+        self._url_email_batch = f"{config.services.email_service_url}/email/batch"
+        
+        # service_url -> (checked_at, healthy); refreshed in the background
+        self._health_cache: Dict[str, Tuple[float, bool]] = {}
+        self._health_ttl = 15.0
+        self._health_lock = threading.Lock()
+        self.start_health_monitor()
         
     def setup_logging(self):
+        # LOG_PER_PROCESS is set by gunicorn.conf.py when running more than one worker
         self.logger = LoggerSetup.setup_logger(
             'orchestrator',
             self.config.logging,
-            'orchestrator.log'
+            'orchestrator.log',
+            per_process=get_env_bool('LOG_PER_PROCESS', False)
         )
     
-    def check_service_health(self, service_url: str) -> bool:
+    def setup_session(self):
+        # Reuse keep-alive connections to the downstream services across calls
+        self.session = requests.Session()
+        self.timeout = (3.05, 30)  # (connect, read) seconds
+        # Only GETs are replayed on read errors and 5xx. POSTs (/email/batch sends mail,
+        # /orders/status updates Baselinker) are retried only when the connection never opened.
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=20,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset(["GET"])
+            )
+        )
+        self.session.mount('http://', adapter)
+        self.session.headers.update({"Accept": "application/json", "Content-Type": "application/json"})
+    
+    def start_health_monitor(self):
+        """Keep the health cache warm so /process never waits on health probes."""
+        def refresh():
+            while True:
+                for _, service_url in self._services:
+                    self._probe_service_health(service_url)
+                time.sleep(self._health_ttl)
+        
+        threading.Thread(target=refresh, name="health-monitor", daemon=True).start()
+    
+    def _probe_service_health(self, service_url: str) -> bool:
         try:
-            response = requests.get(f"{service_url}/health", timeout=5)
-            return response.status_code == 200
+            response = self.session.get(f"{service_url}/health", timeout=5)
+            healthy = response.status_code == 200
         except Exception as e:
             self.logger.error(f"Health check failed for {service_url}: {e}")
-            return False
+            healthy = False
+        
+        with self._health_lock:
+            self._health_cache[service_url] = (time.monotonic(), healthy)
+        return healthy
     
-    def check_for_new_orders(self, days_ago: int = 3) -> bool:
+    def check_service_health(self, service_url: str) -> bool:
+        with self._health_lock:
+            cached = self._health_cache.get(service_url)
+        if cached is not None and time.monotonic() - cached[0] < self._health_ttl:
+            return cached[1]
+        return self._probe_service_health(service_url)
+    
+    def check_services_health(self, services: Tuple[Tuple[str, str], ...]) -> Dict[str, bool]:
+        # Probe all services concurrently so the total wait is the slowest RTT, not the sum
+        with ThreadPoolExecutor(max_workers=len(services)) as executor:
+            results = executor.map(self.check_service_health, [url for _, url in services])
+            return {name: healthy for (name, _), healthy in zip(services, results)}
+    
+    @staticmethod
+    def _stream_json_fields(response: requests.Response) -> Dict[str, Any]:
+        """Parse a top-level JSON object straight off the socket, field by field."""
+        response.raw.decode_content = True
+        return dict(ijson.kvitems(response.raw, '', use_float=True))
+    
+    @staticmethod
+    def _encode_body(json_body: Any) -> Optional[bytes]:
+        """Models serialize straight to JSON bytes in pydantic-core; plain dicts go through orjson."""
+        if json_body is None:
+            return None
+        if isinstance(json_body, BaseModel):
+            return json_body.model_dump_json(exclude_none=True).encode()
+        return orjson.dumps(json_body)
+    
+    def _call(self, method: str, url: str, *, params: Dict[str, Any] = None, json_body: Any = None,
+              default: Any = None, stream: bool = False) -> Any:
+        """Make a downstream call and return its decoded JSON body, or `default` on any failure."""
         try:
-            response = requests.get(
-                f"{self.config.services.order_service_url}/orders/check",
-                params={"days_ago": days_ago}
-            )
-            if response.status_code == 200:
-                return response.json().get("has_new_orders", False)
-            return False
+            with self.session.request(
+                method,
+                url,
+                params=params,
+                data=self._encode_body(json_body),
+                timeout=self.timeout,
+                stream=stream
+            ) as response:
+                # The email endpoints answer 202 Accepted
+                if not 200 <= response.status_code < 300:
+                    return default
+                if stream:
+                    return self._stream_json_fields(response)
+                return orjson.loads(response.content)
         except Exception as e:
-            self.logger.error(f"Error checking for new orders: {e}")
-            return False
+            self.logger.error(f"Error calling {method} {url}: {e}")
+            return default
+    
+    def check_for_new_orders(self, days_ago: int = 3) -> bool:
+        """Boolean-only probe for callers that don't need the orders; process_orders skips it."""
+        data = self._call("GET", self._url_orders_check, params={"days_ago": days_ago}, default={})
+        return data.get("has_new_orders", False)
     
     def get_order_details(self, days_ago: int = 3) -> OrderData:
-        try:
-            response = requests.get(
-                f"{self.config.services.order_service_url}/orders/details",
-                params={"days_ago": days_ago}
-            )
-            if response.status_code == 200:
-                data = response.json()
-                return OrderData(
-                    order_ids=data.get('order_ids', []),
-                    files=data.get('files', []),
-                    quantities=data.get('quantities', {})
-                )
-            return OrderData([], [], {})
-        except Exception as e:
-            self.logger.error(f"Error getting order details: {e}")
-            return OrderData([], [], {})
+        data = self._call("GET", self._url_orders_details, params={"days_ago": days_ago}, default={}, stream=True)
+        # The order service already shaped this payload; skip re-validating every entry
+        return OrderData.model_construct(
+            order_ids=data.get('order_ids', []),
+            files=data.get('files', []),
+            quantities=data.get('quantities', {})
+        )
     
     def check_files_availability(self, required_files: list) -> FileData:
-        try:
-            response = requests.post(
-                f"{self.config.services.file_service_url}/files/check",
-                json={
-                    "required_files": required_files,
-                    "share_email": self.config.google_drive.share_email
-                }
-            )
-            if response.status_code == 200:
-                data = response.json()
-                return FileData(
-                    available_files=data.get('available_files', {}),
-                    missing_files=data.get('missing_files', []),
-                    total_found=data.get('total_found', 0)
-                )
-            return FileData({}, [], 0)
-        except Exception as e:
-            self.logger.error(f"Error checking file availability: {e}")
-            return FileData({}, [], 0)
-    
-    def send_print_order_email(self, order_data: OrderData, file_data: FileData) -> bool:
-        try:
-            response = requests.post(
-                f"{self.config.services.email_service_url}/email/print-order",
-                json={
-                    "files_data": {
-                        "quantities": order_data.quantities,
-                        "order_ids": order_data.order_ids
-                    },
-                    "available_files": file_data.available_files,
-                    "to_email": self.config.email.print_email
-                }
-            )
-            return response.status_code == 200 and response.json().get("success", False)
-        except Exception as e:
-            self.logger.error(f"Error sending print order email: {e}")
-            return False
+        data = self._call(
+            "POST",
+            self._url_files_check,
+            json_body={
+                "required_files": required_files,
+                "share_email": self.config.google_drive.share_email
+            },
+            default={},
+            stream=True
+        )
+        return FileData.model_construct(
+            available_files=data.get('available_files', {}),
+            missing_files=data.get('missing_files', []),
+            total_found=data.get('total_found', 0)
+        )
     
-    def send_missing_files_email(self, order_data: OrderData, missing_files: list) -> bool:
-        try:
-            response = requests.post(
-                f"{self.config.services.email_service_url}/email/missing-files",
-                json={
-                    "order_ids": order_data.order_ids,
-                    "missing_files": missing_files,
-                    "quantities": order_data.quantities,
-                    "to_email": self.config.email.admin_email
-                }
-            )
-            return response.status_code == 200 and response.json().get("success", False)
-        except Exception as e:
-            self.logger.error(f"Error sending missing files email: {e}")
-            return False
+    def send_email_batch(self, order_data: OrderData, file_data: FileData) -> List[bool]:
+        """Send all order notifications in a single email-service call."""
+        # Inputs come from OrderData/FileData, so the payload models are built without revalidation
+        ops = []
+        if file_data.available_files:
+            ops.append(EmailBatchOp.model_construct(
+                type="print-order",
+                available_files=file_data.available_files,
+                to_email=self.config.email.print_email
+            ))
+        if file_data.missing_files:
+            ops.append(EmailBatchOp.model_construct(
+                type="missing-files",
+                missing_files=file_data.missing_files,
+                to_email=self.config.email.admin_email
+            ))
+        if not ops:
+            return []
+        
+        payload = EmailBatchPayload.model_construct(
+            common=EmailBatchCommon.model_construct(
+                order_ids=order_data.order_ids,
+                quantities=order_data.quantities
+            ),
+            ops=ops
+        )
+        data = self._call("POST", self._url_email_batch, json_body=payload)
+        if data is None:
+            return [False] * len(ops)
+        return [result.get("success", False) for result in data.get("data", {}).get("results", [])]
     
     def update_order_status(self, order_ids: list) -> bool:
-        try:
-            response = requests.post(
-                f"{self.config.services.order_service_url}/orders/status",
-                json={
-                    "order_ids": order_ids,
-                    "status_id": self.config.baselinker.processed_status_id
-                }
-            )
-            return response.status_code == 200 and response.json().get("success", False)
-        except Exception as e:
-            self.logger.error(f"Error updating order status: {e}")
-            return False
+        data = self._call(
+            "POST",
+            self._url_orders_status,
+            json_body={
+                "order_ids": order_ids,
+                "status_id": self.config.baselinker.processed_status_id
+            },
+            default={}
+        )
+        return data.get("success", False)
     
     def process_orders(self) -> Dict[str, Any]:
         try:
             # Check if services are healthy
-            services = {
-                "order-service": self.config.services.order_service_url,
-                "file-service": self.config.services.file_service_url,
-                "email-service": self.config.services.email_service_url
-            }
-            
-            for service_name, service_url in services.items():
-                if not self.check_service_health(service_url):
+            health_status = self.check_services_health(self._services)
+            for service_name, healthy in health_status.items():
+                if not healthy:
                     self.logger.error(f"{service_name} is not healthy")
                     return {"success": False, "error": f"{service_name} is not available"}
             
-            # Check for new orders
-            if not self.check_for_new_orders():
+            # Get order details; an empty result already means nothing to do,
+            # so there is no separate /orders/check round-trip here
+            order_data = self.get_order_details()
+            if not order_data.order_ids:
                 self.logger.info("No new orders found that meet payment criteria")
                 return {"success": True, "message": "No new orders to process"}
             
             self.logger.info("New valid orders found, processing...")
             
-            # Get order details
-            order_data = self.get_order_details()
-            if not order_data.order_ids:
-                self.logger.info("No orders met payment criteria after detailed processing")
-                return {"success": True, "message": "No valid orders after processing"}
-            
             # Check file availability
             file_data = self.check_files_availability(order_data.files)
+            if not file_data.available_files and not file_data.missing_files:
+                self.logger.warning("File check returned no available or missing files, leaving orders untouched")
+                return {"success": True, "message": "No files to process"}
             
             results = {
                 "orders_processed": len(order_data.order_ids),
@@ -174,22 +257,21 @@ class OrderOrchestrator:
                 "emails_sent": 0
             }
             
-            # Send print order email if files are available
             if file_data.available_files:
                 self.logger.info(f"Found {file_data.total_found} files to process for {len(order_data.order_ids)} valid orders")
-                if self.send_print_order_email(order_data, file_data):
-                    self.logger.info("Print order email sent successfully")
-                    results["emails_sent"] += 1
-            
-            # Send missing files email if any files are missing
             if file_data.missing_files:
                 self.logger.warning(f"Missing files found: {file_data.missing_files}")
-                if self.send_missing_files_email(order_data, file_data.missing_files):
-                    self.logger.info("Missing files notification sent")
-                    results["emails_sent"] += 1
             
-            # Update order status
-            if self.update_order_status(order_data.order_ids):
+            # Send print order and missing files emails in one batch call
+            email_results = self.send_email_batch(order_data, file_data)
+            results["emails_sent"] = sum(email_results)
+            if results["emails_sent"]:
+                self.logger.info(f"Sent {results['emails_sent']} of {len(email_results)} notification emails")
+            
+            # Only mark orders as processed once a notification actually went out
+            if not results["emails_sent"]:
+                self.logger.warning("No emails were sent, skipping order status update")
+            elif self.update_order_status(order_data.order_ids):
                 self.logger.info(f"Updated status for {len(order_data.order_ids)} orders")
             
             return {"success": True, "results": results}
@@ -198,7 +280,7 @@ class OrderOrchestrator:
             self.logger.error(f"Error processing orders: {e}")
             return {"success": False, "error": str(e)}
 
-config = AppConfig.from_env()
+config = get_config()
 orchestrator = OrderOrchestrator(config)
 
 @app.get('/health')
@@ -216,15 +298,7 @@ def process_orders():
 
 @app.get('/services/health')
 def check_all_services():
-    services = {
-        "order-service": config.services.order_service_url,
-        "file-service": config.services.file_service_url,
-        "email-service": config.services.email_service_url
-    }
-    
-    health_status = {}
-    for service_name, service_url in services.items():
-        health_status[service_name] = orchestrator.check_service_health(service_url)
+    health_status = orchestrator.check_services_health(orchestrator._services)
     
     all_healthy = all(health_status.values())
     return {
@@ -234,12 +308,14 @@ def check_all_services():
 
 if __name__ == '__main__':
     try:
+        # Local development entrypoint; containers run gunicorn (see gunicorn.conf.py)
         orchestrator.logger.info("Starting order orchestrator service...")
         uvicorn.run(
             "app:app",
             host='0.0.0.0', 
             port=config.services.orchestrator_port, 
-            reload=True,
+            reload=config.environment.debug,
+            timeout_keep_alive=30,  # match gunicorn.conf.py keepalive
             log_level="info" if not config.environment.debug else "debug"
         )
     except Exception as e:
@@ -0,0 +1,24 @@
+# Gunicorn settings for the orchestrator (see Dockerfile CMD)
+import os
+
+bind = f"0.0.0.0:{os.getenv('ORCHESTRATOR_PORT', '5000')}"
+
+# FastAPI is ASGI, so run uvicorn workers under gunicorn's process manager.
+# Sync route handlers still execute in each worker's threadpool.
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv('ORCHESTRATOR_WORKERS', '2'))
+
+# Each worker builds its own OrderOrchestrator, so with several workers each one writes
+# orchestrator.<pid>.log (RotatingFileHandler can't share a file across processes) and runs
+# its own health monitor: one probe of every service per worker every 15 s, which keeps
+# that worker's health cache fresh for /process
+raw_env = [f"LOG_PER_PROCESS={'true' if workers > 1 else 'false'}"]
+
+# Keep client connections (process_orders.py, healthchecks) open for reuse
+keepalive = 30
+
+# /process waits on Drive lookups and SMTP sends
+timeout = 180
+
+# Build the OrderOrchestrator (and its requests.Session) in each worker, not before fork
+preload_app = False
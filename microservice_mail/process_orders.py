@@ -20,20 +20,23 @@ env_file = project_root / '.env'
 if env_file.exists():
     load_dotenv(env_file)
 
-from shared.config import AppConfig
+from shared.config import get_config
 
 def main():
     try:
-        config = AppConfig.from_env()
+        config = get_config()
         orchestrator_url = f"http://localhost:{config.services.orchestrator_port}"
         
         print("🔍 Processing orders...")
         print(f"📊 Orchestrator URL: {orchestrator_url}")
         print()
         
+        # Share one connection between the health check and the process call
+        session = requests.Session()
+        
         # Check health first
         try:
-            health_response = requests.get(f"{orchestrator_url}/services/health", timeout=10)
+            health_response = session.get(f"{orchestrator_url}/services/health", timeout=10)
             if health_response.status_code == 200:
                 health_data = health_response.json()
                 services_health = health_data.get('services', {})
@@ -57,7 +60,7 @@ def main():
         # Process orders
         print("🚀 Starting order processing...")
         
-        response = requests.post(f"{orchestrator_url}/process", timeout=120)
+        response = session.post(f"{orchestrator_url}/process", timeout=120)
         
         if response.status_code == 200:
             result = response.json()
@@ -1,44 +1,98 @@
-from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from pydantic import BaseModel
-import smtplib
-from email.mime.text import MIMEText
+import aiosmtplib
+import asyncio
+from email.message import EmailMessage
 import logging
 import sys
 import os
 import time
-import uuid
-from typing import Dict, Any, Optional
+import itertools
+import functools
+from contextvars import ContextVar
+import secrets
+from typing import Dict, Any, List, Optional, Tuple
 from dotenv import load_dotenv
 import uvicorn
-from datetime import datetime
-import json
-import traceback
+from tenacity import retry, stop_after_attempt, wait_exponential_jitter, retry_if_exception_type
+import orjson
 
 # Load environment variables from .env file
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '..', '.env'))
 
 # Add shared module to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
-from shared.config import AppConfig
-from shared.utils import retry_on_failure, format_error_response, format_success_response, validate_email
+from shared.config import AppConfig, get_config, get_env_int
+from shared.utils import format_error_response, format_success_response, validate_email, format_info, SharedCounter
 from shared.logging_config import LoggerSetup
+from shared.smtp_pool import SMTPConnectionPool, CONNECTION_ERRORS
+from shared.models import EmailRequest, MissingFilesEmailRequest
 
 # Initialize configuration first
-config = AppConfig.from_env()
+config = get_config()
+
+# Gmail allows about 15 simultaneous SMTP sessions per account, and every worker keeps its own pool
+GMAIL_MAX_SMTP_CONNECTIONS = 15
+
+def uvicorn_worker_count() -> int:
+    """(2*cpu)+1 by default, capped so all workers' SMTP pools fit in the Gmail limit."""
+    requested = get_env_int('UVICORN_WORKERS', get_env_int('WEB_CONCURRENCY', (os.cpu_count() or 1) * 2 + 1))
+    cap = max(1, GMAIL_MAX_SMTP_CONNECTIONS // max(1, config.email.smtp_pool_size))
+    return max(1, min(requested, cap))
+
+# One process per worker sidesteps the GIL; reload (debug) mode runs a single worker.
+# Evaluated identically in the launcher and in every worker it spawns.
+WORKERS = 1 if config.environment.debug else uvicorn_worker_count()
 
 # Setup advanced logging
-logger = LoggerSetup.setup_logger("email_service", config.logging, "email_service.log")
-security_logger = LoggerSetup.setup_logger("email_service.security", config.logging, "email_security.log")
-performance_logger = LoggerSetup.setup_logger("email_service.performance", config.logging, "email_performance.log")
-audit_logger = LoggerSetup.setup_logger("email_service.audit", config.logging, "email_audit.log")
+# The security/performance/audit loggers have no handlers of their own: they
+# propagate to "email_service" and share its single file, told apart by %(name)s.
+# With several workers each process writes its own file: RotatingFileHandler can't rotate a shared one safely.
+logger = LoggerSetup.setup_logger(
+    "email_service",
+    config.logging,
+    "email_service.log",
+    max_bytes=50 * 1024 * 1024,
+    per_process=WORKERS > 1
+)
+security_logger = LoggerSetup.get_logger("email_service.security")
+performance_logger = LoggerSetup.get_logger("email_service.performance")
+audit_logger = LoggerSetup.get_logger("email_service.audit")
+
+# Request IDs are a per-worker random prefix plus a counter: unique without a urandom call per request
+_WORKER_PREFIX = secrets.token_hex(4)
+_request_counter = itertools.count()
+
+def new_request_id() -> str:
+    return f"{_WORKER_PREFIX}-{next(_request_counter):x}"
+
+# Current request ID, set by LoggingMiddleware and stamped onto every log record
+REQUEST_ID: ContextVar[str] = ContextVar("request_id", default="-")
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = REQUEST_ID.get()
+        return True
+
+for _logger in (logger, security_logger, performance_logger, audit_logger):
+    _logger.addFilter(RequestIdFilter())
+
+# Recipients are mostly the configured admin/print addresses, so this is nearly always a cache hit
+@functools.lru_cache(maxsize=512)
+def _mask_and_domain(addr: str) -> Tuple[str, str]:
+    masked = (addr[:3] + "*****" + addr[-5:]) if len(addr) > 8 else "****"
+    domain = addr.partition('@')[2] or "unknown"
+    return masked, domain
 
 class LoggingMiddleware(BaseHTTPMiddleware):
     """Advanced logging middleware for request/response tracking and performance monitoring."""
     
     async def dispatch(self, request: Request, call_next):
-        # Generate request ID for tracing
-        request_id = str(uuid.uuid4())
+        # Reuse the caller's request ID for tracing, or generate one
+        request_id = request.headers.get("x-request-id") or new_request_id()
+        REQUEST_ID.set(request_id)
         start_time = time.time()
         
         # Log incoming request
@@ -48,12 +102,10 @@ class LoggingMiddleware(BaseHTTPMiddleware):
         logger.info(
             f"Request started",
             extra={
-                "request_id": request_id,
                 "method": request.method,
                 "url": str(request.url),
                 "client_ip": client_ip,
-                "user_agent": user_agent,
-                "timestamp": datetime.now().isoformat()
+                "user_agent": user_agent
             }
         )
         
@@ -62,17 +114,13 @@ class LoggingMiddleware(BaseHTTPMiddleware):
             security_logger.info(
                 f"Email service access",
                 extra={
-                    "request_id": request_id,
                     "endpoint": request.url.path,
                     "client_ip": client_ip,
-                    "user_agent": user_agent,
-                    "timestamp": datetime.now().isoformat()
+                    "user_agent": user_agent
                 }
             )
         
         try:
-            # Add request_id to request state for use in handlers
-            request.state.request_id = request_id
             response = await call_next(request)
             
             # Calculate response time
@@ -82,10 +130,8 @@ class LoggingMiddleware(BaseHTTPMiddleware):
             logger.info(
                 f"Request completed",
                 extra={
-                    "request_id": request_id,
                     "status_code": response.status_code,
-                    "process_time": f"{process_time:.4f}s",
-                    "timestamp": datetime.now().isoformat()
+                    "process_time": f"{process_time:.4f}s"
                 }
             )
             
@@ -93,12 +139,10 @@ class LoggingMiddleware(BaseHTTPMiddleware):
             performance_logger.info(
                 f"Request performance",
                 extra={
-                    "request_id": request_id,
                     "method": request.method,
                     "endpoint": request.url.path,
                     "status_code": response.status_code,
-                    "process_time": process_time,
-                    "timestamp": datetime.now().isoformat()
+                    "process_time": process_time
                 }
             )
             
@@ -111,39 +155,25 @@ class LoggingMiddleware(BaseHTTPMiddleware):
         except Exception as e:
             process_time = time.time() - start_time
             
-            logger.error(
+            logger.exception(
                 f"Request failed with exception",
                 extra={
-                    "request_id": request_id,
                     "error": str(e),
-                    "process_time": f"{process_time:.4f}s",
-                    "traceback": traceback.format_exc(),
-                    "timestamp": datetime.now().isoformat()
+                    "process_time": f"{process_time:.4f}s"
                 }
             )
             raise
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 app.add_middleware(LoggingMiddleware)
 
 # Pydantic models for request validation
-class SendEmailRequest(BaseModel):
-    to_email: str
-    subject: str
-    body: str
-
-class PrintOrderRequest(BaseModel):
-    files_data: Dict[str, Any]
-    available_files: Dict[str, Any]
-    to_email: Optional[str] = None
-    subject: Optional[str] = None
-
-class MissingFilesRequest(BaseModel):
-    order_ids: list
-    missing_files: list
-    quantities: Dict[str, int]
-    to_email: Optional[str] = None
-    subject: Optional[str] = None
+class EmailBatchRequest(BaseModel):
+    common: Dict[str, Any]
+    ops: List[Dict[str, Any]]
+
+# RFC 5322 / SMTP limit on a line of 8bit body text, excluding CRLF
+SMTP_MAX_LINE_OCTETS = 998
 
 class EmailService:
     def __init__(self, config: AppConfig):
@@ -152,7 +182,19 @@ class EmailService:
         self.gmail_password = config.email.gmail_password
         self.smtp_server = config.email.smtp_server
         self.smtp_port = config.email.smtp_port
-        self.email_send_count = 0
+        
+        # Sends are counted across all uvicorn worker processes
+        self._send_counter = SharedCounter(os.path.join(config.logging.log_dir, "email_send_count"))
+        
+        # Warm, logged-in connections leased per send, so concurrent requests don't queue on one session
+        self.pool = SMTPConnectionPool(
+            self.smtp_server,
+            self.smtp_port,
+            self.gmail_user,
+            self.gmail_password,
+            max_size=config.email.smtp_pool_size,
+            max_msgs_per_conn=config.email.smtp_max_msgs_per_conn
+        )
         
         # Log service initialization
         logger.info(
@@ -160,329 +202,341 @@ class EmailService:
             extra={
                 "smtp_server": self.smtp_server,
                 "smtp_port": self.smtp_port,
-                "gmail_user": self.gmail_user[:5] + "*****" if self.gmail_user else "not_set",
-                "timestamp": datetime.now().isoformat()
+                "gmail_user": self.gmail_user[:5] + "*****" if self.gmail_user else "not_set"
             }
         )
     
-    def _log_email_attempt(self, request_id: str, to_email: str, subject: str, body_length: int):
+    @property
+    def email_send_count(self) -> int:
+        return self._send_counter.value
+    
+    async def close_smtp(self):
+        """Close all pooled SMTP connections."""
+        await self.pool.close()
+    
+    def _log_email_attempt(self, masked_email: str, subject: str, body_length: int):
         """Log email sending attempt with details."""
+        if not audit_logger.isEnabledFor(logging.INFO):
+            return
         audit_logger.info(
             "Email send attempt",
             extra={
-                "request_id": request_id,
-                "to_email_masked": to_email[:3] + "*****" + to_email[-5:] if len(to_email) > 8 else "****",
+                "to_email_masked": masked_email,
                 "subject": subject,
-                "body_length": body_length,
-                "attempt_timestamp": datetime.now().isoformat()
+                "body_length": body_length
             }
         )
     
-    def _log_email_success(self, request_id: str, to_email: str, subject: str, processing_time: float):
+    def _log_email_success(self, masked_email: str, subject: str, processing_time: float, total_emails_sent: int):
         """Log successful email sending."""
-        self.email_send_count += 1
-        
-        audit_logger.info(
-            "Email sent successfully",
-            extra={
-                "request_id": request_id,
-                "to_email_masked": to_email[:3] + "*****" + to_email[-5:] if len(to_email) > 8 else "****",
-                "subject": subject,
-                "processing_time": processing_time,
-                "total_emails_sent": self.email_send_count,
-                "success_timestamp": datetime.now().isoformat()
-            }
-        )
+        if audit_logger.isEnabledFor(logging.INFO):
+            audit_logger.info(
+                "Email sent successfully",
+                extra={
+                    "to_email_masked": masked_email,
+                    "subject": subject,
+                    "processing_time": processing_time,
+                    "total_emails_sent": total_emails_sent
+                }
+            )
         
-        performance_logger.info(
-            "Email processing performance",
-            extra={
-                "request_id": request_id,
-                "operation": "send_email",
-                "processing_time": processing_time,
-                "success": True,
-                "timestamp": datetime.now().isoformat()
-            }
-        )
+        if performance_logger.isEnabledFor(logging.INFO):
+            performance_logger.info(
+                "Email processing performance",
+                extra={
+                    "operation": "send_email",
+                    "processing_time": processing_time,
+                    "success": True
+                }
+            )
     
-    def _log_email_failure(self, request_id: str, to_email: str, subject: str, error: str, error_type: str, processing_time: float):
+    def _log_email_failure(self, masked_email: str, subject: str, error: str, error_type: str, processing_time: float):
         """Log email sending failure with detailed error information."""
+        if not security_logger.isEnabledFor(logging.WARNING):
+            return
         security_logger.warning(
             "Email send failure",
             extra={
-                "request_id": request_id,
-                "to_email_masked": to_email[:3] + "*****" + to_email[-5:] if len(to_email) > 8 else "****",
+                "to_email_masked": masked_email,
                 "subject": subject,
                 "error_type": error_type,
                 "error_message": error,
-                "processing_time": processing_time,
-                "failure_timestamp": datetime.now().isoformat()
+                "processing_time": processing_time
             }
         )
     
-    @retry_on_failure(max_retries=3, delay=1.0)
-    def send_email(self, to_email: str, subject: str, body: str, request_id: str = None) -> Dict[str, Any]:
+    # Only transient connection problems are retried; auth, recipient and validation errors fail fast
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential_jitter(initial=0.2, max=2.0),
+        retry=retry_if_exception_type(CONNECTION_ERRORS),
+        reraise=True
+    )
+    async def send_email(self, to_email: str, subject: str, body: str) -> Dict[str, Any]:
         start_time = time.time()
-        request_id = request_id or str(uuid.uuid4())
+        masked_email, email_domain = _mask_and_domain(to_email)
         
         logger.info(
             f"Starting email send process",
             extra={
-                "request_id": request_id,
-                "to_email_domain": to_email.split('@')[1] if '@' in to_email else "unknown",
+                "to_email_domain": email_domain,
                 "subject_length": len(subject),
-                "body_length": len(body),
-                "timestamp": datetime.now().isoformat()
+                "body_length": len(body)
             }
         )
         
         # Log the attempt
-        self._log_email_attempt(request_id, to_email, subject, len(body))
+        self._log_email_attempt(masked_email, subject, len(body))
         
         # Validate email address
         if not validate_email(to_email):
             error_msg = f"Invalid email address: {to_email}"
             processing_time = time.time() - start_time
-            self._log_email_failure(request_id, to_email, subject, error_msg, "VALIDATION_ERROR", processing_time)
+            self._log_email_failure(masked_email, subject, error_msg, "VALIDATION_ERROR", processing_time)
             raise ValueError(error_msg)
         
         # Validate inputs
         if not subject or not body:
             error_msg = "Subject and body cannot be empty"
             processing_time = time.time() - start_time
-            self._log_email_failure(request_id, to_email, subject, error_msg, "VALIDATION_ERROR", processing_time)
+            self._log_email_failure(masked_email, subject, error_msg, "VALIDATION_ERROR", processing_time)
             raise ValueError(error_msg)
         
         try:
-            logger.debug(
-                f"Creating email message",
-                extra={
-                    "request_id": request_id,
-                    "from_email": self.gmail_user,
-                    "to_email": to_email,
-                    "timestamp": datetime.now().isoformat()
-                }
-            )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    f"Creating email message",
+                    extra={
+                        "from_email": self.gmail_user,
+                        "to_email": to_email
+                    }
+                )
             
-            msg = MIMEText(body.encode('utf-8'), 'plain', 'utf-8')
+            # Gmail advertises 8BITMIME, so the body goes out without a base64 pass,
+            # unless a line (e.g. a long order-ID list) exceeds the SMTP line limit
+            msg = EmailMessage()
             msg['Subject'] = subject
             msg['From'] = self.gmail_user
             msg['To'] = to_email
+            longest_line = max(map(len, body.encode('utf-8').splitlines()), default=0)
+            cte = '8bit' if longest_line <= SMTP_MAX_LINE_OCTETS else 'quoted-printable'
+            msg.set_content(body, subtype='plain', charset='utf-8', cte=cte)
             
-            logger.debug(
-                f"Connecting to SMTP server",
-                extra={
-                    "request_id": request_id,
-                    "smtp_server": self.smtp_server,
-                    "smtp_port": self.smtp_port,
-                    "timestamp": datetime.now().isoformat()
-                }
-            )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    f"Connecting to SMTP server",
+                    extra={
+                        "smtp_server": self.smtp_server,
+                        "smtp_port": self.smtp_port
+                    }
+                )
             
-            server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port)
-            server.login(self.gmail_user, self.gmail_password)
-            server.send_message(msg)
-            server.close()
+            async with self.pool.lease() as server:
+                await server.send_message(msg)
             
             processing_time = time.time() - start_time
             
             logger.info(
                 f'Email sent successfully to {to_email}',
                 extra={
-                    "request_id": request_id,
-                    "processing_time": f"{processing_time:.4f}s",
-                    "timestamp": datetime.now().isoformat()
+                    "processing_time": f"{processing_time:.4f}s"
                 }
             )
             
-            self._log_email_success(request_id, to_email, subject, processing_time)
+            # The shared counter takes a file lock; keep that blocking I/O off the event loop
+            total_emails_sent = await asyncio.get_running_loop().run_in_executor(None, self._send_counter.increment)
+            self._log_email_success(masked_email, subject, processing_time, total_emails_sent)
             
             return {"success": True, "message": f"Email sent to {to_email}", "processing_time": processing_time}
             
-        except smtplib.SMTPAuthenticationError as e:
+        except aiosmtplib.SMTPAuthenticationError as e:
             processing_time = time.time() - start_time
             error_msg = "Email authentication failed. Check credentials."
-            self._log_email_failure(request_id, to_email, subject, str(e), "SMTP_AUTH_ERROR", processing_time)
+            self._log_email_failure(masked_email, subject, str(e), "SMTP_AUTH_ERROR", processing_time)
             logger.error(
                 f"SMTP authentication failed",
                 extra={
-                    "request_id": request_id,
                     "error": str(e),
-                    "processing_time": f"{processing_time:.4f}s",
-                    "timestamp": datetime.now().isoformat()
+                    "processing_time": f"{processing_time:.4f}s"
                 }
             )
             raise Exception(error_msg)
-        except smtplib.SMTPRecipientsRefused as e:
+        except aiosmtplib.SMTPRecipientsRefused as e:
             processing_time = time.time() - start_time
             error_msg = f"Email recipient refused: {to_email}"
-            self._log_email_failure(request_id, to_email, subject, str(e), "SMTP_RECIPIENT_ERROR", processing_time)
+            self._log_email_failure(masked_email, subject, str(e), "SMTP_RECIPIENT_ERROR", processing_time)
             logger.error(
                 f"SMTP recipients refused",
                 extra={
-                    "request_id": request_id,
                     "error": str(e),
-                    "processing_time": f"{processing_time:.4f}s",
-                    "timestamp": datetime.now().isoformat()
+                    "processing_time": f"{processing_time:.4f}s"
                 }
             )
             raise Exception(error_msg)
-        except smtplib.SMTPException as e:
+        except CONNECTION_ERRORS as e:
+            processing_time = time.time() - start_time
+            self._log_email_failure(masked_email, subject, str(e), "SMTP_CONNECTION_ERROR", processing_time)
+            logger.warning(
+                f"SMTP connection lost",
+                extra={
+                    "error": str(e),
+                    "processing_time": f"{processing_time:.4f}s"
+                }
+            )
+            raise
+        except aiosmtplib.SMTPException as e:
             processing_time = time.time() - start_time
             error_msg = f"Email sending failed: {str(e)}"
-            self._log_email_failure(request_id, to_email, subject, str(e), "SMTP_ERROR", processing_time)
+            self._log_email_failure(masked_email, subject, str(e), "SMTP_ERROR", processing_time)
             logger.error(
                 f"SMTP error",
                 extra={
-                    "request_id": request_id,
                     "error": str(e),
-                    "processing_time": f"{processing_time:.4f}s",
-                    "timestamp": datetime.now().isoformat()
+                    "processing_time": f"{processing_time:.4f}s"
                 }
             )
             raise Exception(error_msg)
         except Exception as e:
             processing_time = time.time() - start_time
-            self._log_email_failure(request_id, to_email, subject, str(e), "UNEXPECTED_ERROR", processing_time)
-            logger.error(
+            self._log_email_failure(masked_email, subject, str(e), "UNEXPECTED_ERROR", processing_time)
+            logger.exception(
                 f"Unexpected error sending email",
                 extra={
-                    "request_id": request_id,
                     "error": str(e),
-                    "processing_time": f"{processing_time:.4f}s",
-                    "traceback": traceback.format_exc(),
-                    "timestamp": datetime.now().isoformat()
+                    "processing_time": f"{processing_time:.4f}s"
                 }
             )
             raise
     
-    def create_print_order_email(self, files_data: Dict[str, Any], available_files: Dict[str, Any], request_id: str = None) -> str:
-        request_id = request_id or str(uuid.uuid4())
-        
+    def create_print_order_email(self, quantities: Dict[str, int], available_files: Dict[str, Any]) -> str:
         logger.info(
             "Creating print order email",
             extra={
-                "request_id": request_id,
-                "file_count": len(files_data.get('quantities', {})),
-                "available_files_count": len(available_files),
-                "timestamp": datetime.now().isoformat()
+                "file_count": len(quantities),
+                "available_files_count": len(available_files)
             }
         )
         
-        email_body = "Dzień dobry,\n\nPrzesyłam pliki do druku:\n\n"
+        # file-service keys available_files by lowercased name, so each file is one lookup
+        parts = ["Dzień dobry,\n\nPrzesyłam pliki do druku:\n\n"]
         processed_files = 0
         
-        for filename, quantity in files_data.get('quantities', {}).items():
-            if filename.lower() in available_files:
-                file_info = available_files[filename.lower()]
-                format_info = self.get_format_info(filename)
-                email_body += f"{filename} -- {quantity} szt. {format_info}\n"
-                email_body += f"Link: {file_info['webViewLink']}\n\n"
-                processed_files += 1
-                
-                logger.debug(
-                    f"Processed file for print order",
-                    extra={
-                        "request_id": request_id,
-                        "filename": filename,
-                        "quantity": quantity,
-                        "format_info": format_info,
-                        "timestamp": datetime.now().isoformat()
-                    }
-                )
+        for filename, quantity in quantities.items():
+            filename_lower = filename.lower()
+            file_info = available_files.get(filename_lower)
+            if file_info is None:
+                continue
+            
+            link = file_info['webViewLink']
+            print_format = format_info(filename)
+            parts.append(f"{filename} -- {quantity} szt. {print_format}\nLink: {link}\n\n")
+            processed_files += 1
         
-        email_body += "\nPozdrawiam"
+        parts.append("\nPozdrawiam")
+        email_body = "".join(parts)
         
         audit_logger.info(
             "Print order email created",
             extra={
-                "request_id": request_id,
                 "processed_files": processed_files,
-                "email_body_length": len(email_body),
-                "timestamp": datetime.now().isoformat()
+                "email_body_length": len(email_body)
             }
         )
         
         return email_body
     
-    def create_missing_files_email(self, order_ids: list, missing_files: list, quantities: Dict[str, int], request_id: str = None) -> str:
-        request_id = request_id or str(uuid.uuid4())
-        
+    def create_missing_files_email(self, order_ids: list, missing_files: list, quantities: Dict[str, int]) -> str:
         logger.info(
             "Creating missing files email",
             extra={
-                "request_id": request_id,
                 "order_count": len(order_ids),
-                "missing_files_count": len(missing_files),
-                "timestamp": datetime.now().isoformat()
+                "missing_files_count": len(missing_files)
             }
         )
         
-        email_body = f"Brakujące pliki dla zamówień: {', '.join(order_ids)}\n\n"
+        parts = [f"Brakujące pliki dla zamówień: {', '.join(order_ids)}\n\n"]
         
         for filename in missing_files:
             quantity = quantities.get(filename, 'N/A')
-            email_body += f"{filename} -- {quantity} szt.\n"
-            
-            logger.debug(
-                f"Added missing file to email",
-                extra={
-                    "request_id": request_id,
-                    "filename": filename,
-                    "quantity": quantity,
-                    "timestamp": datetime.now().isoformat()
-                }
-            )
+            parts.append(f"{filename} -- {quantity} szt.\n")
+        
+        email_body = "".join(parts)
         
         audit_logger.info(
             "Missing files email created",
             extra={
-                "request_id": request_id,
                 "order_ids": order_ids,
                 "missing_files_count": len(missing_files),
-                "email_body_length": len(email_body),
-                "timestamp": datetime.now().isoformat()
+                "email_body_length": len(email_body)
             }
         )
         
         return email_body
     
     def get_format_info(self, filename: str) -> str:
-        filename_lower = filename.lower()
-        
-        format_info = ""
-        if filename_lower.endswith('_b2') or '_b2' in filename_lower:
-            format_info = "format 50 x 70 cm"
-        elif filename_lower.endswith('_45'):
-            format_info = "format 40x50 cm"
-        elif '_a3' in filename_lower:
-            format_info = "format 30x40 cm"
-        
-        logger.debug(
-            f"Format info determined",
+        return format_info(filename)
+
+# Initialize email service
+email_service = EmailService(config)
+
+# At most this many accepted emails may be waiting on SMTP; beyond that callers get a 503
+MAX_PENDING_EMAILS = 32
+_send_slots = asyncio.BoundedSemaphore(MAX_PENDING_EMAILS)
+
+class EmailQueueFullError(Exception):
+    pass
+
+async def _send_in_background(to_email: str, subject: str, body: str):
+    try:
+        await email_service.send_email(to_email, subject, body)
+    except Exception as e:
+        # send_email has already logged the failure details
+        logger.error(f"Background email send failed: {e}")
+    finally:
+        _send_slots.release()
+
+async def schedule_email(background_tasks: BackgroundTasks, to_email: str, subject: str, body: str):
+    """Validate an email and queue it for delivery after the response is sent."""
+    if not validate_email(to_email):
+        raise ValueError(f"Invalid email address: {to_email}")
+    if not subject or not body:
+        raise ValueError("Subject and body cannot be empty")
+    if _send_slots.locked():
+        raise EmailQueueFullError(f"Too many pending emails (limit {MAX_PENDING_EMAILS})")
+    
+    await _send_slots.acquire()  # a slot is free, so this does not wait
+    background_tasks.add_task(_send_in_background, to_email, subject, body)
+
+@app.on_event("startup")
+async def warm_smtp_pool():
+    # A failure here is not fatal: the first send will connect (and retry) on its own
+    try:
+        await email_service.pool.warm()
+    except Exception as e:
+        logger.warning(
+            "Could not pre-open SMTP connection",
             extra={
-                "filename": filename,
-                "format_info": format_info if format_info else "no_specific_format",
-                "timestamp": datetime.now().isoformat()
+                "error": str(e)
             }
         )
-        
-        return format_info
 
-# Initialize email service
-email_service = EmailService(config)
+@app.on_event("shutdown")
+async def close_smtp_connection():
+    await email_service.close_smtp()
+
+@app.on_event("shutdown")
+def stop_log_listeners():
+    LoggerSetup.stop_listeners()
 
 @app.get('/health')
-def health_check(request: Request):
-    request_id = getattr(request.state, 'request_id', str(uuid.uuid4()))
+def health_check():
+    request_id = REQUEST_ID.get()
     
     logger.info(
         "Health check accessed",
         extra={
-            "request_id": request_id,
             "email_service_status": "healthy",
-            "total_emails_sent": email_service.email_send_count,
-            "timestamp": datetime.now().isoformat()
+            "total_emails_sent": email_service.email_send_count
         }
     )
     
@@ -493,103 +547,112 @@ def health_check(request: Request):
         "total_emails_sent": email_service.email_send_count
     }
 
-@app.post('/email/send')
-def send_email(request_data: SendEmailRequest, request: Request):
-    request_id = getattr(request.state, 'request_id', str(uuid.uuid4()))
-    
+@app.post('/email/send', status_code=202)
+async def send_email(request_data: EmailRequest, background_tasks: BackgroundTasks):
     logger.info(
         "Send email endpoint called",
         extra={
-            "request_id": request_id,
-            "to_email_domain": request_data.to_email.split('@')[1] if '@' in request_data.to_email else "unknown",
+            "to_email_domain": _mask_and_domain(request_data.to_email)[1],
             "subject_length": len(request_data.subject),
-            "body_length": len(request_data.body),
-            "timestamp": datetime.now().isoformat()
+            "body_length": len(request_data.body)
         }
     )
     
     try:
-        result = email_service.send_email(
+        await schedule_email(
+            background_tasks,
             request_data.to_email,
             request_data.subject,
-            request_data.body,
-            request_id
+            request_data.body
         )
         
         audit_logger.info(
-            "Send email endpoint success",
+            "Send email endpoint accepted",
             extra={
-                "request_id": request_id,
                 "endpoint": "/email/send",
-                "success": True,
-                "timestamp": datetime.now().isoformat()
+                "success": True
             }
         )
         
-        return format_success_response(result)
+        return format_success_response({"accepted": True, "request_id": REQUEST_ID.get()})
     except ValueError as e:
         logger.warning(
             f"Validation error in send email endpoint",
             extra={
-                "request_id": request_id,
                 "error": str(e),
-                "error_type": "VALIDATION_ERROR",
-                "timestamp": datetime.now().isoformat()
+                "error_type": "VALIDATION_ERROR"
             }
         )
         raise HTTPException(status_code=400, detail=format_error_response(str(e), "VALIDATION_ERROR"))
+    except EmailQueueFullError as e:
+        logger.warning(
+            f"Email queue full",
+            extra={
+                "error": str(e),
+                "error_type": "EMAIL_QUEUE_FULL"
+            }
+        )
+        raise HTTPException(status_code=503, detail=format_error_response(str(e), "EMAIL_QUEUE_FULL"))
     except Exception as e:
-        logger.error(
+        logger.exception(
             f"Error in send email endpoint",
             extra={
-                "request_id": request_id,
                 "error": str(e),
-                "error_type": "EMAIL_SEND_ERROR",
-                "traceback": traceback.format_exc(),
-                "timestamp": datetime.now().isoformat()
+                "error_type": "EMAIL_SEND_ERROR"
             }
         )
         raise HTTPException(status_code=500, detail=format_error_response(str(e), "EMAIL_SEND_ERROR"))
 
-@app.post('/email/print-order')
-def send_print_order_email(request_data: PrintOrderRequest, request: Request):
-    request_id = getattr(request.state, 'request_id', str(uuid.uuid4()))
-    
-    logger.info(
-        "Print order email endpoint called",
-        extra={
-            "request_id": request_id,
-            "files_count": len(request_data.files_data.get('quantities', {})),
-            "available_files_count": len(request_data.available_files),
-            "has_custom_recipient": request_data.to_email is not None,
-            "has_custom_subject": request_data.subject is not None,
-            "timestamp": datetime.now().isoformat()
-        }
-    )
+@app.post('/email/print-order', status_code=202)
+async def send_print_order_email(request: Request, background_tasks: BackgroundTasks):
+    request_id = REQUEST_ID.get()
     
     try:
-        files_data = request_data.files_data
-        available_files = request_data.available_files
+        # Large orders carry thousands of entries; parse them with orjson instead of
+        # copying them through Pydantic, since only quantities and webViewLink are read
+        payload = orjson.loads(await request.body())
+        if not isinstance(payload, dict):
+            raise ValueError("Request body must be a JSON object")
+        files_data = payload.get('files_data')
+        if not isinstance(files_data, dict):
+            raise ValueError("files_data must be an object")
+        quantities = files_data.get('quantities')
+        available_files = payload.get('available_files')
+        if not isinstance(quantities, dict) or not isinstance(available_files, dict):
+            raise ValueError("files_data.quantities and available_files must be objects")
+        # create_print_order_email reads entry['webViewLink']; reject bad entries here as a 400
+        for entry in available_files.values():
+            if not isinstance(entry, dict) or not isinstance(entry.get('webViewLink'), str):
+                raise ValueError("available_files entries must be objects with a webViewLink string")
+        
+        logger.info(
+            "Print order email endpoint called",
+            extra={
+                "files_count": len(quantities),
+                "available_files_count": len(available_files),
+                "has_custom_recipient": payload.get('to_email') is not None,
+                "has_custom_subject": payload.get('subject') is not None
+            }
+        )
+        
         to_email = config.email.recipient_email
-        subject = request_data.subject or 'Plakaty do druku'
+        subject = payload.get('subject') or 'Plakaty do druku'
         
-        email_body = email_service.create_print_order_email(files_data, available_files, request_id)
-        result = email_service.send_email(to_email, subject, email_body, request_id)
+        email_body = email_service.create_print_order_email(quantities, available_files)
+        await schedule_email(background_tasks, to_email, subject, email_body)
         
         audit_logger.info(
-            "Print order email sent successfully",
+            "Print order email accepted",
             extra={
-                "request_id": request_id,
                 "endpoint": "/email/print-order",
                 "recipient": to_email,
-                "files_processed": len([f for f in files_data.get('quantities', {}).keys() if f.lower() in available_files]),
-                "success": True,
-                "timestamp": datetime.now().isoformat()
+                "files_processed": len([f for f in quantities if f.lower() in available_files]),
+                "success": True
             }
         )
         
         return format_success_response({
-            "email_sent": result,
+            "accepted": True,
             "email_body": email_body,
             "recipient": to_email,
             "request_id": request_id
@@ -598,39 +661,41 @@ def send_print_order_email(request_data: PrintOrderRequest, request: Request):
         logger.warning(
             f"Validation error in print order endpoint",
             extra={
-                "request_id": request_id,
                 "error": str(e),
-                "error_type": "VALIDATION_ERROR",
-                "timestamp": datetime.now().isoformat()
+                "error_type": "VALIDATION_ERROR"
             }
         )
         raise HTTPException(status_code=400, detail=format_error_response(str(e), "VALIDATION_ERROR"))
+    except EmailQueueFullError as e:
+        logger.warning(
+            f"Email queue full",
+            extra={
+                "error": str(e),
+                "error_type": "EMAIL_QUEUE_FULL"
+            }
+        )
+        raise HTTPException(status_code=503, detail=format_error_response(str(e), "EMAIL_QUEUE_FULL"))
     except Exception as e:
-        logger.error(
+        logger.exception(
             f"Error in print order endpoint",
             extra={
-                "request_id": request_id,
                 "error": str(e),
-                "error_type": "PRINT_ORDER_EMAIL_ERROR",
-                "traceback": traceback.format_exc(),
-                "timestamp": datetime.now().isoformat()
+                "error_type": "PRINT_ORDER_EMAIL_ERROR"
             }
         )
         raise HTTPException(status_code=500, detail=format_error_response(str(e), "PRINT_ORDER_EMAIL_ERROR"))
 
-@app.post('/email/missing-files')
-def send_missing_files_email(request_data: MissingFilesRequest, request: Request):
-    request_id = getattr(request.state, 'request_id', str(uuid.uuid4()))
+@app.post('/email/missing-files', status_code=202)
+async def send_missing_files_email(request_data: MissingFilesEmailRequest, background_tasks: BackgroundTasks):
+    request_id = REQUEST_ID.get()
     
     logger.info(
         "Missing files email endpoint called",
         extra={
-            "request_id": request_id,
             "order_count": len(request_data.order_ids),
             "missing_files_count": len(request_data.missing_files),
             "has_custom_recipient": request_data.to_email is not None,
-            "has_custom_subject": request_data.subject is not None,
-            "timestamp": datetime.now().isoformat()
+            "has_custom_subject": request_data.subject is not None
         }
     )
     
@@ -644,24 +709,22 @@ def send_missing_files_email(request_data: MissingFilesRequest, request: Request
         if not order_ids or not missing_files:
             raise ValueError("Order IDs and missing files cannot be empty")
         
-        email_body = email_service.create_missing_files_email(order_ids, missing_files, quantities, request_id)
-        result = email_service.send_email(to_email, subject, email_body, request_id)
+        email_body = email_service.create_missing_files_email(order_ids, missing_files, quantities)
+        await schedule_email(background_tasks, to_email, subject, email_body)
         
         audit_logger.info(
-            "Missing files email sent successfully",
+            "Missing files email accepted",
             extra={
-                "request_id": request_id,
                 "endpoint": "/email/missing-files",
                 "recipient": to_email,
                 "order_ids": order_ids,
                 "missing_files_count": len(missing_files),
-                "success": True,
-                "timestamp": datetime.now().isoformat()
+                "success": True
             }
         )
         
         return format_success_response({
-            "email_sent": result,
+            "accepted": True,
             "email_body": email_body,
             "recipient": to_email,
             "missing_files_count": len(missing_files),
@@ -671,26 +734,91 @@ def send_missing_files_email(request_data: MissingFilesRequest, request: Request
         logger.warning(
             f"Validation error in missing files endpoint",
             extra={
-                "request_id": request_id,
                 "error": str(e),
-                "error_type": "VALIDATION_ERROR",
-                "timestamp": datetime.now().isoformat()
+                "error_type": "VALIDATION_ERROR"
             }
         )
         raise HTTPException(status_code=400, detail=format_error_response(str(e), "VALIDATION_ERROR"))
+    except EmailQueueFullError as e:
+        logger.warning(
+            f"Email queue full",
+            extra={
+                "error": str(e),
+                "error_type": "EMAIL_QUEUE_FULL"
+            }
+        )
+        raise HTTPException(status_code=503, detail=format_error_response(str(e), "EMAIL_QUEUE_FULL"))
     except Exception as e:
-        logger.error(
+        logger.exception(
             f"Error in missing files endpoint",
             extra={
-                "request_id": request_id,
                 "error": str(e),
-                "error_type": "MISSING_FILES_EMAIL_ERROR",
-                "traceback": traceback.format_exc(),
-                "timestamp": datetime.now().isoformat()
+                "error_type": "MISSING_FILES_EMAIL_ERROR"
             }
         )
         raise HTTPException(status_code=500, detail=format_error_response(str(e), "MISSING_FILES_EMAIL_ERROR"))
 
+@app.post('/email/batch')
+async def send_email_batch(request_data: EmailBatchRequest):
+    """Send several order emails in one call; each op shares the `common` payload."""
+    request_id = REQUEST_ID.get()
+    
+    logger.info(
+        "Email batch endpoint called",
+        extra={
+            "op_count": len(request_data.ops),
+            "op_types": [op.get("type") for op in request_data.ops]
+        }
+    )
+    
+    order_ids = request_data.common.get('order_ids', [])
+    quantities = request_data.common.get('quantities', {})
+    results = []
+    
+    for op in request_data.ops:
+        op_type = op.get("type")
+        try:
+            if op_type == "print-order":
+                to_email = config.email.recipient_email
+                subject = op.get('subject') or 'Plakaty do druku'
+                email_body = email_service.create_print_order_email(quantities, op.get('available_files', {}))
+            elif op_type == "missing-files":
+                to_email = config.email.admin_email
+                subject = op.get('subject') or 'BRAK PLIKÓW - Plakaty'
+                missing_files = op.get('missing_files', [])
+                if not order_ids or not missing_files:
+                    raise ValueError("Order IDs and missing files cannot be empty")
+                email_body = email_service.create_missing_files_email(order_ids, missing_files, quantities)
+            else:
+                raise ValueError(f"Unknown email batch op type: {op_type}")
+            
+            await email_service.send_email(to_email, subject, email_body)
+            results.append({"type": op_type, "success": True, "recipient": to_email})
+        except Exception as e:
+            logger.exception(
+                f"Error in email batch op",
+                extra={
+                    "op_type": op_type,
+                    "error": str(e)
+                }
+            )
+            results.append({"type": op_type, "success": False, "error": str(e)})
+    
+    audit_logger.info(
+        "Email batch processed",
+        extra={
+            "endpoint": "/email/batch",
+            "order_ids": order_ids,
+            "sent": sum(1 for result in results if result["success"]),
+            "failed": sum(1 for result in results if not result["success"])
+        }
+    )
+    
+    return format_success_response({
+        "results": results,
+        "request_id": request_id
+    })
+
 if __name__ == '__main__':
     # Setup advanced logging
     service_logger = LoggerSetup.setup_fastapi_logging(app, config.logging, "email_service")
@@ -705,11 +833,11 @@ if __name__ == '__main__':
         extra={
             "service": "email-service",
             "port": 5003,
+            "workers": WORKERS,
             "debug_mode": config.environment.debug,
             "log_level": config.logging.log_level,
             "log_dir": config.logging.log_dir,
-            "smtp_server": config.email.smtp_server,
-            "startup_timestamp": datetime.now().isoformat()
+            "smtp_server": config.email.smtp_server
         }
     )
     
@@ -724,8 +852,7 @@ if __name__ == '__main__':
             "recipient_email_configured": bool(config.email.recipient_email),
             "recipient_email": config.email.recipient_email if config.email.recipient_email else "not_set",
             "smtp_server": config.email.smtp_server,
-            "smtp_port": config.email.smtp_port,
-            "timestamp": datetime.now().isoformat()
+            "smtp_port": config.email.smtp_port
         }
     )
     
@@ -734,16 +861,18 @@ if __name__ == '__main__':
             "app:app",
             host='0.0.0.0', 
             port=5003, 
-            reload=True,
+            workers=WORKERS,
+            reload=config.environment.debug,
+            loop="uvloop",
+            http="httptools",
             log_level="info" if not config.environment.debug else "debug"
         )
     except Exception as e:
         logger.critical(
             "Failed to start email service",
             extra={
-                "error": str(e),
-                "traceback": traceback.format_exc(),
-                "timestamp": datetime.now().isoformat()
-            }
+                "error": str(e)
+            },
+            exc_info=True
         )
         sys.exit(1)
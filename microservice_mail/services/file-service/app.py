@@ -5,6 +5,7 @@ from googleapiclient.discovery import build
 import logging
 import sys
 import os
+import threading
 from typing import Dict, List, Tuple, Optional
 from dotenv import load_dotenv
 import uvicorn
@@ -14,8 +15,9 @@ load_dotenv(os.path.join(os.path.dirname(__file__), '..', '..', '.env'))
 
 # Add shared module to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
-from shared.config import AppConfig
-from shared.cache import cache_drive_search
+from shared.config import AppConfig, get_config, resolve_project_path
+from shared.cache import cache_drive_listing
+from shared.utils import format_info
 
 app = FastAPI()
 
@@ -24,27 +26,35 @@ class CheckFilesRequest(BaseModel):
     required_files: List[str]
     share_email: Optional[str] = None
 
+# Google's batch endpoint accepts at most 100 calls per request
+DRIVE_BATCH_LIMIT = 100
+# Names per files.list query; long OR-chains hit Drive's query length limit
+DRIVE_QUERY_CHUNK = 30
+
 class FileService:
     def __init__(self, config: AppConfig):
         self.config = config
         self.scopes = config.google_drive.scopes
         self.service_account_file = config.google_drive.service_account_file
         self.folder_id = config.google_drive.folder_id
+        self._credentials = None
+        self._local = threading.local()
+        self._shared = set()  # (file_id, email) pairs this process has already shared
         
     def create_drive_service(self):
-        service_account_file = self.service_account_file
-        
-        # If path is relative, make it absolute from project root
-        if not os.path.isabs(service_account_file):
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            project_root = os.path.dirname(os.path.dirname(current_dir))
-            service_account_file = os.path.join(project_root, service_account_file)
-        
-        credentials = service_account.Credentials.from_service_account_file(
-            service_account_file,
-            scopes=self.scopes
-        )
-        return build('drive', 'v3', credentials=credentials)
+        # Credentials are read from disk once and refresh their own token;
+        # the service object wraps a non-thread-safe httplib2 client, so one per thread
+        if self._credentials is None:
+            self._credentials = service_account.Credentials.from_service_account_file(
+                resolve_project_path(self.service_account_file),
+                scopes=self.scopes
+            )
+        
+        service = getattr(self._local, 'drive_service', None)
+        if service is None:
+            service = build('drive', 'v3', credentials=self._credentials, cache_discovery=False)
+            self._local.drive_service = service
+        return service
     
     def share_file_with_viewer(self, service, file_id: str, email: str) -> bool:
         try:
@@ -65,61 +75,140 @@ class FileService:
             logging.error(f"Error sharing file: {e}")
             return False
     
-    @cache_drive_search
-    def get_drive_files(self, required_files: List[str], share_email: str = None) -> Tuple[Dict, List]:
-        if share_email is None:
-            share_email = self.config.google_drive.share_email
-            
-        service = self.create_drive_service()
+    def share_files_with_viewer(self, service, file_ids: List[str], email: str) -> int:
+        """Share several files in batched requests; returns how many were shared."""
+        # Files already shared with this address by this process need no second call
+        pending = [file_id for file_id in dict.fromkeys(file_ids) if (file_id, email) not in self._shared]
+        if not pending:
+            return 0
         
-        try:
-            # Build search query for specific files to reduce API calls
-            required_files_lower = [f.lower() for f in required_files]
+        user_permission = {
+            'type': 'user',
+            'role': 'reader',
+            'emailAddress': email
+        }
+        shared = []
+        
+        def on_response(request_id, response, exception):
+            if exception is not None:
+                logging.error(f"Error sharing file {request_id}: {exception}")
+            else:
+                shared.append(request_id)
+        
+        for start in range(0, len(pending), DRIVE_BATCH_LIMIT):
+            batch = service.new_batch_http_request(callback=on_response)
+            for file_id in pending[start:start + DRIVE_BATCH_LIMIT]:
+                batch.add(
+                    service.permissions().create(
+                        fileId=file_id,
+                        body=user_permission,
+                        sendNotificationEmail=False
+                    ),
+                    request_id=file_id
+                )
+            try:
+                batch.execute()
+            except Exception as e:
+                logging.error(f"Error sharing files: {e}")
+        
+        self._shared.update((file_id, email) for file_id in shared)
+        return len(shared)
+    
+    def _add_to_listing(self, listing: Dict[str, Dict], files: List[Dict]) -> None:
+        for file in files:
+            file_name_lower = file['name'].lower()
+            listing[file_name_lower] = file
             
-            # Create a query that searches for specific files only
+            # Files uploaded without an extension still match a required .pdf name
+            if not file_name_lower.endswith('.pdf'):
+                listing.setdefault(f"{file_name_lower}.pdf", file)
+    
+    def _search_names(self, service, names: List[str]) -> Dict[str, Dict]:
+        """Look up specific files with short OR-queries, sent together in batched requests."""
+        listing = {}
+        
+        def on_response(request_id, response, exception):
+            if exception is not None:
+                raise exception
+            self._add_to_listing(listing, response.get('files', []))
+        
+        queries = []
+        for start in range(0, len(names), DRIVE_QUERY_CHUNK):
             file_queries = []
-            for file_name in required_files_lower:
+            for file_name in names[start:start + DRIVE_QUERY_CHUNK]:
                 # Remove .pdf extension if present for search
-                base_name = file_name.replace('.pdf', '') if file_name.endswith('.pdf') else file_name
+                base_name = file_name[:-4] if file_name.endswith('.pdf') else file_name
+                base_name = base_name.replace('\\', '\\\\').replace("'", "\\'")
                 file_queries.append(f"name contains '{base_name}'")
-            
-            # Combine queries with OR operator and limit to parent folder
-            search_query = f"'{self.folder_id}' in parents and ({' or '.join(file_queries)})"
-            
-            logging.info(f"Optimized search query: {search_query}")
-            
-            # Single API call with targeted search
+            queries.append(f"'{self.folder_id}' in parents and trashed = false and ({' or '.join(file_queries)})")
+        
+        for start in range(0, len(queries), DRIVE_BATCH_LIMIT):
+            batch = service.new_batch_http_request(callback=on_response)
+            for search_query in queries[start:start + DRIVE_BATCH_LIMIT]:
+                batch.add(service.files().list(
+                    q=search_query,
+                    pageSize=1000,
+                    fields="files(id, name, webViewLink)"
+                ))
+            batch.execute()
+        
+        return listing
+    
+    @cache_drive_listing
+    def list_drive_folder(self, names: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """List files in the folder keyed by lowercased name: all of them, or only `names`."""
+        service = self.create_drive_service()
+        if names is not None:
+            listing = self._search_names(service, names)
+            logging.info(f"Found {len(listing)} of {len(names)} looked-up files in Drive folder")
+            return listing
+        
+        search_query = f"'{self.folder_id}' in parents and trashed = false"
+        
+        listing = {}
+        page_token = None
+        while True:
             results = service.files().list(
                 q=search_query,
-                pageSize=1000,  # Should be more than enough for specific files
-                fields="files(id, name, webViewLink)"
+                pageSize=1000,
+                fields="nextPageToken, files(id, name, webViewLink)",
+                pageToken=page_token
             ).execute()
             
-            found_files = results.get('files', [])
-            logging.info(f"Found {len(found_files)} files matching search criteria")
-            
-            # Create lookup dictionary
-            available_files = {}
-            found_file_names = set()
+            self._add_to_listing(listing, results.get('files', []))
             
-            for file in found_files:
-                file_name_lower = file['name'].lower()
-                available_files[file_name_lower] = file
-                found_file_names.add(file_name_lower)
-                
-                # Also check for .pdf extension matches
-                if not file_name_lower.endswith('.pdf'):
-                    pdf_name = f"{file_name_lower}.pdf"
-                    if pdf_name in required_files_lower:
-                        available_files[pdf_name] = file
-                        found_file_names.add(pdf_name)
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+        
+        logging.info(f"Listed {len(listing)} files in Drive folder")
+        return listing
+    
+    def get_drive_files(self, required_files: List[str], share_email: str = None) -> Tuple[Dict, List]:
+        if share_email is None:
+            share_email = self.config.google_drive.share_email
+        
+        try:
+            required_files_lower = [f.lower() for f in required_files]
+            listing = self.list_drive_folder(required_files_lower)
             
-            # Share only the found files (much faster)
-            for file in found_files:
-                self.share_file_with_viewer(service, file['id'], share_email)
+            # One lookup per required file sorts it into available or missing
+            available_files = {}
+            missing_files = []
+            for name, name_lower in zip(required_files, required_files_lower):
+                file = listing.get(name_lower)
+                if file is None:
+                    missing_files.append(name)
+                else:
+                    available_files[name_lower] = file
             
-            # Determine missing files
-            missing_files = [name for name in required_files if name.lower() not in found_file_names]
+            # Share only the found files; ones already shared by this process are skipped
+            if available_files:
+                self.share_files_with_viewer(
+                    self.create_drive_service(),
+                    [file['id'] for file in available_files.values()],
+                    share_email
+                )
             
             logging.info(f"Available files: {len(available_files)}, Missing files: {len(missing_files)}")
             
@@ -130,19 +219,10 @@ class FileService:
             return {}, []
     
     def get_format_info(self, filename: str) -> str:
-        filename_lower = filename.lower()
-        
-        if filename_lower.endswith('_b2') or '_b2' in filename_lower:
-            return "format 50 x 70 cm"
-        elif filename_lower.endswith('45'):
-            return "format 40x50 cm"
-        elif '_a3' in filename_lower:
-            return "format 30x40 cm"
-        else:
-            return ""
+        return format_info(filename)
 
 # Initialize configuration and file service
-config = AppConfig.from_env()
+config = get_config()
 file_service = FileService(config)
 
 @app.get('/health')
@@ -173,12 +253,7 @@ def clear_cache():
         from shared.cache import memory_cache, file_cache
         
         memory_cache.clear()
-        # Clear file cache directory
-        import shutil
-        cache_dir = file_cache.cache_dir
-        if cache_dir.exists():
-            shutil.rmtree(cache_dir)
-            cache_dir.mkdir(exist_ok=True)
+        file_cache.clear()
         
         return {"success": True, "message": "Cache cleared successfully"}
     except Exception as e:
@@ -1,11 +1,15 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
 import datetime
 import logging
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any, Optional
 from dotenv import load_dotenv
 import uvicorn
@@ -15,15 +19,18 @@ load_dotenv(os.path.join(os.path.dirname(__file__), '..', '..', '.env'))
 
 # Add shared module to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
-from shared.config import AppConfig
+from shared.config import AppConfig, get_config
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Pydantic models for request validation
 class UpdateStatusRequest(BaseModel):
     order_ids: List[str]
     status_id: Optional[str] = None
 
+# Concurrent setOrderStatus calls, kept modest to stay inside Baselinker's rate limit
+STATUS_UPDATE_WORKERS = 8
+
 class OrderService:
     def __init__(self, config: AppConfig):
         self.config = config
@@ -32,12 +39,29 @@ class OrderService:
         self.headers = {'X-BLToken': self.token}
         self.pending_status_id = config.baselinker.pending_status_id
         self.processed_status_id = config.baselinker.processed_status_id
+        self.setup_session()
+    
+    def setup_session(self):
+        """Keep Baselinker connections alive across calls instead of a TLS handshake per request."""
+        self.http = requests.Session()
+        self.http.headers.update(self.headers)
+        self.timeout = (3.05, 30)
         
+        # getOrders is read-only and setOrderStatus is idempotent, so POSTs are safe to retry
+        retry = Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["POST"])
+        )
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=max(10, STATUS_UPDATE_WORKERS), max_retries=retry)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+    
     def get_timestamp_for_days_ago(self, days: int) -> int:
-        target_date = datetime.datetime.today() - datetime.timedelta(days=days)
-        date_string = target_date.strftime('%d/%m/%Y')
-        date_obj = datetime.datetime.strptime(date_string, '%d/%m/%Y')
-        return int(date_obj.timestamp())
+        # Local midnight `days` days ago
+        target_date = datetime.date.today() - datetime.timedelta(days=days)
+        return int(datetime.datetime.combine(target_date, datetime.time()).timestamp())
     
     def is_payment_valid(self, order: Dict[str, Any]) -> bool:
         payment_done = order.get('payment_done', 0)
@@ -49,37 +73,34 @@ class OrderService:
         data = {
             "token": self.token,
             'method': 'getOrders',
-            'parameters': json.dumps({
+            'parameters': orjson.dumps({
                 "date_from": unix_timestamp, 
                 "get_unconfirmed_orders": False,
                 "status_id": "219626"
-            })
+            }).decode()
         }
         
-        response = requests.post(self.url, headers=self.headers, data=data)
-        parsed_data = json.loads(response.text)
+        response = self.http.post(self.url, data=data, timeout=self.timeout)
+        parsed_data = orjson.loads(response.content)
         orders = parsed_data.get('orders', [])
         
-        if not orders:
-            return False
-        
-        valid_orders = [order for order in orders if self.is_payment_valid(order)]
-        return bool(valid_orders)
+        # getOrders has no field selection, but there is no need to check past the first valid order
+        return any(self.is_payment_valid(order) for order in orders)
     
     def get_order_details(self, days_ago: int = 3) -> Dict[str, Any]:
         unix_timestamp = self.get_timestamp_for_days_ago(days_ago)
         data = {
             "token": self.token,
             'method': 'getOrders',
-            'parameters': json.dumps({
+            'parameters': orjson.dumps({
                 "date_from": unix_timestamp, 
                 "get_unconfirmed_orders": False,
                 "status_id": "219626"
-            })
+            }).decode()
         }
         
-        response = requests.post(self.url, headers=self.headers, data=data)
-        parsed_data = json.loads(response.text)
+        response = self.http.post(self.url, data=data, timeout=self.timeout)
+        parsed_data = orjson.loads(response.content)
         orders = parsed_data['orders']
         
         valid_orders = [order for order in orders if self.is_payment_valid(order)]
@@ -104,29 +125,35 @@ class OrderService:
         
         return output
     
+    def _set_status_one(self, order_id_str: str, new_status_id: str) -> None:
+        order_id_int = int(order_id_str)
+        data = {
+            "token": self.token,
+            'method': 'setOrderStatus',
+            'parameters': orjson.dumps({
+                "order_id": order_id_int, 
+                "status_id": new_status_id
+            }).decode()
+        }
+        response = self.http.post(self.url, data=data, timeout=self.timeout)
+        logging.info(f"Updated status for order {order_id_int}")
+    
     def update_order_status(self, order_ids: List[str], new_status_id: str = None) -> bool:
         if new_status_id is None:
             new_status_id = self.processed_status_id
+        if not order_ids:
+            return True
         try:
-            for order_id_str in order_ids:
-                order_id_int = int(order_id_str)
-                data = {
-                    "token": self.token,
-                    'method': 'setOrderStatus',
-                    'parameters': json.dumps({
-                        "order_id": order_id_int, 
-                        "status_id": new_status_id
-                    })
-                }
-                response = requests.post(self.url, headers=self.headers, data=data)
-                logging.info(f"Updated status for order {order_id_int}")
+            # One Baselinker round trip per order; run them side by side instead of back to back
+            with ThreadPoolExecutor(max_workers=min(STATUS_UPDATE_WORKERS, len(order_ids))) as executor:
+                list(executor.map(lambda order_id_str: self._set_status_one(order_id_str, new_status_id), order_ids))
             return True
         except Exception as e:
             logging.error(f"Error updating order status: {e}")
             return False
 
 # Initialize configuration and order service
-config = AppConfig.from_env()
+config = get_config()
 order_service = OrderService(config)
 
 @app.get('/health')
@@ -1,9 +1,11 @@
 import time
-import json
+import pickle
+import sqlite3
 import logging
 from typing import Any, Dict, Optional, Tuple
 from pathlib import Path
 import threading
+from concurrent.futures import ThreadPoolExecutor
 
 class SimpleCache:
     """Simple in-memory cache with TTL (Time To Live) support."""
@@ -12,20 +14,35 @@ class SimpleCache:
         self.cache: Dict[str, Dict] = {}
         self.default_ttl = default_ttl
         self._lock = threading.Lock()
+        self.cleanup_interval = max(1, default_ttl // 2)
+        self._start_cleanup_thread()
+    
+    def _start_cleanup_thread(self) -> None:
+        """Sweep expired entries periodically so unread ones don't linger."""
+        def sweep():
+            while True:
+                time.sleep(self.cleanup_interval)
+                self.cleanup_expired()
+        
+        threading.Thread(target=sweep, name="cache-cleanup", daemon=True).start()
     
     def get(self, key: str) -> Optional[Any]:
         """Get value from cache if not expired."""
-        with self._lock:
-            if key not in self.cache:
-                return None
-            
-            entry = self.cache[key]
-            if time.time() > entry['expires_at']:
-                del self.cache[key]
-                return None
-            
-            logging.debug(f"Cache hit for key: {key}")
-            return entry['value']
+        # Reads skip the lock: dict.get is atomic under the GIL and entries are never
+        # mutated in place, only replaced or removed by writers holding the lock
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        
+        if time.monotonic() > entry['expires_at_mono']:
+            with self._lock:
+                # A concurrent set may have replaced the entry; only drop the stale one
+                if self.cache.get(key) is entry:
+                    del self.cache[key]
+            return None
+        
+        logging.debug("Cache hit for key: %s", key)
+        return entry['value']
     
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
         """Set value in cache with TTL."""
@@ -35,17 +52,18 @@ class SimpleCache:
         with self._lock:
             self.cache[key] = {
                 'value': value,
-                'expires_at': time.time() + ttl,
+                # TTLs run on the monotonic clock so wall-clock jumps can't extend or cut them
+                'expires_at_mono': time.monotonic() + ttl,
                 'created_at': time.time()
             }
-            logging.debug(f"Cache set for key: {key}, TTL: {ttl}s")
+            logging.debug("Cache set for key: %s, TTL: %ss", key, ttl)
     
     def delete(self, key: str) -> bool:
         """Delete key from cache."""
         with self._lock:
             if key in self.cache:
                 del self.cache[key]
-                logging.debug(f"Cache deleted for key: {key}")
+                logging.debug("Cache deleted for key: %s", key)
                 return True
             return False
     
@@ -57,74 +75,75 @@ class SimpleCache:
     
     def cleanup_expired(self) -> int:
         """Remove expired entries and return count removed."""
-        current_time = time.time()
+        current_time = time.monotonic()
         expired_keys = []
         
         with self._lock:
             for key, entry in self.cache.items():
-                if current_time > entry['expires_at']:
+                if current_time > entry['expires_at_mono']:
                     expired_keys.append(key)
             
             for key in expired_keys:
                 del self.cache[key]
         
         if expired_keys:
-            logging.debug(f"Removed {len(expired_keys)} expired cache entries")
+            logging.debug("Removed %s expired cache entries", len(expired_keys))
         
         return len(expired_keys)
     
     def stats(self) -> Dict[str, Any]:
         """Get cache statistics."""
-        with self._lock:
-            current_time = time.time()
-            active_entries = sum(1 for entry in self.cache.values() 
-                               if current_time <= entry['expires_at'])
-            expired_entries = len(self.cache) - active_entries
-            
-            return {
-                'total_entries': len(self.cache),
-                'active_entries': active_entries,
-                'expired_entries': expired_entries
-            }
+        # Expired entries are dropped on read and by the periodic sweep, so everything
+        # still stored counts as active (lagging by at most one cleanup interval)
+        total_entries = len(self.cache)
+        return {
+            'total_entries': total_entries,
+            'active_entries': total_entries,
+            'expired_entries': 0
+        }
 
 
 class FileCache:
-    """File-based cache for persistent storage."""
+    """SQLite-backed cache for persistent storage, shared by all worker processes."""
     
     def __init__(self, cache_dir: str = "cache", default_ttl: int = 300):
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(exist_ok=True)
+        self.db_path = self.cache_dir / "cache.db"
         self.default_ttl = default_ttl
+        # sqlite3 connections may not cross threads, and FastAPI serves sync endpoints from a pool
+        self._local = threading.local()
     
-    def _get_cache_file(self, key: str) -> Path:
-        """Get cache file path for key."""
-        # Hash key to avoid filesystem issues
-        import hashlib
-        key_hash = hashlib.md5(key.encode()).hexdigest()
-        return self.cache_dir / f"{key_hash}.json"
+    def _conn(self) -> sqlite3.Connection:
+        """Get this thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=5, isolation_level=None)
+            # WAL lets readers in other workers proceed while one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS kv (k TEXT PRIMARY KEY, expires_at REAL, value BLOB)")
+            self._local.conn = conn
+        return conn
     
     def get(self, key: str) -> Optional[Any]:
         """Get value from file cache if not expired."""
-        cache_file = self._get_cache_file(key)
-        
-        if not cache_file.exists():
-            return None
-        
         try:
-            with open(cache_file, 'r') as f:
-                entry = json.load(f)
+            conn = self._conn()
+            row = conn.execute("SELECT value, expires_at FROM kv WHERE k = ?", (key,)).fetchone()
+            if row is None:
+                return None
             
-            if time.time() > entry['expires_at']:
-                cache_file.unlink()  # Delete expired file
+            value, expires_at = row
+            if time.time() > expires_at:
+                conn.execute("DELETE FROM kv WHERE k = ?", (key,))  # Delete expired entry
                 return None
             
-            logging.debug(f"File cache hit for key: {key}")
-            return entry['value']
+            logging.debug("File cache hit for key: %s", key)
+            return pickle.loads(value)
             
-        except (json.JSONDecodeError, KeyError, OSError) as e:
-            logging.warning(f"Error reading cache file for key {key}: {e}")
-            if cache_file.exists():
-                cache_file.unlink()
+        except (sqlite3.Error, pickle.UnpicklingError) as e:
+            logging.warning("Error reading cache entry for key %s: %s", key, e)
             return None
     
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
@@ -132,21 +151,19 @@ class FileCache:
         if ttl is None:
             ttl = self.default_ttl
         
-        cache_file = self._get_cache_file(key)
-        
-        entry = {
-            'value': value,
-            'expires_at': time.time() + ttl,
-            'created_at': time.time(),
-            'key': key  # Store original key for debugging
-        }
-        
         try:
-            with open(cache_file, 'w') as f:
-                json.dump(entry, f)
-            logging.debug(f"File cache set for key: {key}, TTL: {ttl}s")
-        except OSError as e:
-            logging.error(f"Error writing cache file for key {key}: {e}")
+            self._conn().execute(
+                "INSERT OR REPLACE INTO kv (k, expires_at, value) VALUES (?, ?, ?)",
+                (key, time.time() + ttl, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+            )
+            logging.debug("File cache set for key: %s, TTL: %ss", key, ttl)
+        except sqlite3.Error as e:
+            logging.error("Error writing cache entry for key %s: %s", key, e)
+    
+    def clear(self) -> None:
+        """Clear all cache entries."""
+        self._conn().execute("DELETE FROM kv")
+        logging.debug("File cache cleared")
 
 
 # Global cache instances
@@ -154,40 +171,85 @@ memory_cache = SimpleCache(default_ttl=300)  # 5 minutes
 file_cache = FileCache(default_ttl=1800)     # 30 minutes
 
 
-def get_drive_files_cache_key(folder_id: str, required_files: list) -> str:
-    """Generate cache key for Google Drive file searches."""
-    files_str = ','.join(sorted(required_files))
-    return f"drive_files:{folder_id}:{hash(files_str)}"
+# Bump when the cached result format changes so old entries are never read back
+DRIVE_FILES_CACHE_VERSION = 2
 
 
-def cache_drive_search(func):
-    """Decorator to cache Google Drive search results."""
-    def wrapper(self, required_files: list, share_email: str = None):
-        # Generate cache key
-        cache_key = get_drive_files_cache_key(self.folder_id, required_files)
-        
-        # Try to get from cache first
-        cached_result = memory_cache.get(cache_key)
-        if cached_result is not None:
-            logging.info(f"Using cached Google Drive search results for {len(required_files)} files")
-            return cached_result
-        
-        # If not in memory cache, try file cache
-        cached_result = file_cache.get(cache_key)
-        if cached_result is not None:
-            logging.info(f"Using file cached Google Drive search results for {len(required_files)} files")
-            # Promote to memory cache
-            memory_cache.set(cache_key, cached_result, 300)
-            return cached_result
+def get_drive_folder_cache_key(folder_id: str) -> str:
+    """Generate cache key for a Google Drive folder listing."""
+    return f"drive_folder:v{DRIVE_FILES_CACHE_VERSION}:{folder_id}"
+
+
+def _covers(listing: Optional[Dict[str, Any]], required_names: list) -> bool:
+    return listing is not None and all(name in listing for name in required_names)
+
+
+def _lookup_listing(cache_key: str, required_names: list) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """Return the freshest cached listing and whether it covers `required_names`."""
+    # Try to get from cache first
+    listing = memory_cache.get(cache_key)
+    if listing is not None:
+        return listing, _covers(listing, required_names)
+    
+    # If not in memory cache, try file cache
+    listing = file_cache.get(cache_key)
+    if _covers(listing, required_names):
+        # Promote to memory cache
+        memory_cache.set(cache_key, listing, 300)
+        return listing, True
+    return listing, False
+
+
+# Single thread that persists listings, so the disk write is off the request path
+_cache_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-writer")
+
+# One lock per cache key: concurrent misses for the same folder share a single Drive fetch
+_fetch_locks: Dict[str, threading.Lock] = {}
+_fetch_locks_guard = threading.Lock()
+
+
+def _fetch_lock(cache_key: str) -> threading.Lock:
+    with _fetch_locks_guard:
+        return _fetch_locks.setdefault(cache_key, threading.Lock())
+
+
+def cache_drive_listing(func):
+    """Decorator to cache a Google Drive folder listing (lowercased name -> file).
+    
+    One listing per folder serves every request whose required names it covers,
+    whatever their order or mix. The wrapped function is called with None to list
+    the whole folder, or with the names a cached listing lacks to look up just
+    those; the result is merged in, so files uploaded since the last fetch are
+    picked up without relisting the folder.
+    """
+    def wrapper(self, required_names: list) -> Dict[str, Any]:
+        cache_key = get_drive_folder_cache_key(self.folder_id)
         
-        # Cache miss - execute the actual function
-        logging.info(f"Cache miss - performing Google Drive search for {len(required_files)} files")
-        result = func(self, required_files, share_email)
+        listing, covered = _lookup_listing(cache_key, required_names)
+        if covered:
+            logging.info("Using cached Google Drive listing for %s files", len(required_names))
+            return listing
         
-        # Cache the result
-        memory_cache.set(cache_key, result, 300)    # 5 minutes in memory
-        file_cache.set(cache_key, result, 1800)     # 30 minutes on disk
+        with _fetch_lock(cache_key):
+            # Another request may have fetched what we need while we waited
+            listing, covered = _lookup_listing(cache_key, required_names)
+            if covered:
+                logging.info("Using just-fetched Google Drive listing for %s files", len(required_names))
+                return listing
+            
+            if listing is None:
+                # Cache miss - execute the actual function
+                logging.info("Cache miss - listing Google Drive folder for %s files", len(required_names))
+                listing = func(self, None)
+            else:
+                uncovered = [name for name in required_names if name not in listing]
+                logging.info("Cached Google Drive listing lacks %s files - looking them up", len(uncovered))
+                listing = {**listing, **func(self, uncovered)}
+            
+            # Cache the result
+            memory_cache.set(cache_key, listing, 300)                       # 5 minutes in memory
+            _cache_writer.submit(file_cache.set, cache_key, listing, 1800)  # 30 minutes on disk
         
-        return result
+        return listing
     
-    return wrapper
\ No newline at end of file
+    return wrapper
@@ -1,99 +1,135 @@
 import os
+import functools
 import logging
 from dataclasses import dataclass, field
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from pathlib import Path
 
+# Snapshot of os.environ, taken on first lookup so it includes anything load_dotenv added
+_ENV_CACHE: Optional[Dict[str, str]] = None
+
+def refresh_env_cache() -> None:
+    """Re-read os.environ on the next lookup (e.g. after a test changes it)."""
+    global _ENV_CACHE
+    _ENV_CACHE = None
+    get_env_list.cache_clear()
+
+def get_env(key: str, default: Optional[str] = None) -> Optional[str]:
+    """Get environment variable from the process-wide snapshot."""
+    global _ENV_CACHE
+    if _ENV_CACHE is None:
+        _ENV_CACHE = dict(os.environ)
+    return _ENV_CACHE.get(key, default)
+
 def get_env_bool(key: str, default: bool = False) -> bool:
     """Convert environment variable to boolean."""
-    value = os.getenv(key, str(default)).lower()
+    value = get_env(key, str(default)).lower()
     return value in ('true', '1', 'yes', 'on')
 
 def get_env_int(key: str, default: int = 0) -> int:
     """Convert environment variable to integer."""
     try:
-        return int(os.getenv(key, str(default)))
+        return int(get_env(key, str(default)))
     except ValueError:
         return default
 
-def get_env_list(key: str, default: List[str] = None, separator: str = ',') -> List[str]:
-    """Convert environment variable to list."""
-    if default is None:
-        default = []
-    value = os.getenv(key)
+@functools.lru_cache(maxsize=None)
+def get_env_list(key: str, default: Tuple[str, ...] = (), separator: str = ',') -> Tuple[str, ...]:
+    """Convert environment variable to a tuple, parsed once per key (see refresh_env_cache)."""
+    value = get_env(key)
     if value:
-        return [item.strip() for item in value.split(separator)]
+        return tuple(item.strip() for item in value.split(separator))
     return default
 
-@dataclass
-class BaseLinkerConfig:
-    api_url: str = field(default_factory=lambda: os.getenv('BASELINKER_API_URL', 'https://api.baselinker.com/connector.php'))
-    token: str = field(default_factory=lambda: os.getenv('BASELINKER_TOKEN', ''))
-    pending_status_id: str = field(default_factory=lambda: os.getenv('BASELINKER_PENDING_STATUS_ID', '219626'))
-    processed_status_id: str = field(default_factory=lambda: os.getenv('BASELINKER_PROCESSED_STATUS_ID', '342638'))
+def required_fields(**env_names: str):
+    """Class decorator adding a __post_init__ that rejects empty fields.
 
-    def __post_init__(self):
-        if not self.token:
-            raise ValueError("BASELINKER_TOKEN environment variable is required")
+    Keyword arguments map field names to the environment variable named in the error.
+    Apply it below @dataclass so the generated __init__ calls the new __post_init__.
+    """
+    checks = tuple(env_names.items())
 
-@dataclass
-class GoogleDriveConfig:
-    service_account_file: str = field(default_factory=lambda: os.getenv('GOOGLE_DRIVE_SERVICE_ACCOUNT_FILE', 'drive-gmail_service.json'))
-    scopes: List[str] = field(default_factory=lambda: get_env_list('GOOGLE_DRIVE_SCOPES', ['https://www.googleapis.com/auth/drive']))
-    folder_id: str = field(default_factory=lambda: os.getenv('GOOGLE_DRIVE_FOLDER_ID', ''))
-    share_email: str = field(default_factory=lambda: os.getenv('GOOGLE_DRIVE_SHARE_EMAIL', ''))
+    def decorator(cls):
+        original = getattr(cls, '__post_init__', None)
 
-    def __post_init__(self):
-        if not self.folder_id:
-            raise ValueError("GOOGLE_DRIVE_FOLDER_ID environment variable is required")
-        if not self.share_email:
-            raise ValueError("GOOGLE_DRIVE_SHARE_EMAIL environment variable is required")
+        def __post_init__(self):
+            for name, env_name in checks:
+                if not getattr(self, name):
+                    raise ValueError(f"{env_name} environment variable is required")
+            if original is not None:
+                original(self)
+
+        cls.__post_init__ = __post_init__
+        return cls
+    return decorator
+
+# Sections are loaded once per process (see get_config) and compared by identity: eq=False
+# also keeps them hashable, which value-based hashing can't do with list fields like scopes.
+# Python 3.9 has no dataclass(slots=True), and hand-written __slots__ clash with field defaults.
+@dataclass(frozen=True, eq=False)
+@required_fields(token='BASELINKER_TOKEN')
+class BaseLinkerConfig:
+    api_url: str = field(default_factory=lambda: get_env('BASELINKER_API_URL', 'https://api.baselinker.com/connector.php'))
+    token: str = field(default_factory=lambda: get_env('BASELINKER_TOKEN', ''))
+    pending_status_id: str = field(default_factory=lambda: get_env('BASELINKER_PENDING_STATUS_ID', '219626'))
+    processed_status_id: str = field(default_factory=lambda: get_env('BASELINKER_PROCESSED_STATUS_ID', '342638'))
 
-@dataclass
+@dataclass(frozen=True, eq=False)
+@required_fields(folder_id='GOOGLE_DRIVE_FOLDER_ID', share_email='GOOGLE_DRIVE_SHARE_EMAIL')
+class GoogleDriveConfig:
+    service_account_file: str = field(default_factory=lambda: get_env('GOOGLE_DRIVE_SERVICE_ACCOUNT_FILE', 'drive-gmail_service.json'))
+    scopes: List[str] = field(default_factory=lambda: list(get_env_list('GOOGLE_DRIVE_SCOPES', ('https://www.googleapis.com/auth/drive',))))
+    folder_id: str = field(default_factory=lambda: get_env('GOOGLE_DRIVE_FOLDER_ID', ''))
+    share_email: str = field(default_factory=lambda: get_env('GOOGLE_DRIVE_SHARE_EMAIL', ''))
+
+@dataclass(frozen=True, eq=False)
+@required_fields(
+    gmail_user='EMAIL_GMAIL_USER',
+    gmail_password='EMAIL_GMAIL_PASSWORD',
+    print_email='EMAIL_PRINT_EMAIL',
+    admin_email='EMAIL_ADMIN_EMAIL'
+)
 class EmailConfig:
-    smtp_server: str = field(default_factory=lambda: os.getenv('EMAIL_SMTP_SERVER', 'smtp.gmail.com'))
+    smtp_server: str = field(default_factory=lambda: get_env('EMAIL_SMTP_SERVER', 'smtp.gmail.com'))
     smtp_port: int = field(default_factory=lambda: get_env_int('EMAIL_SMTP_PORT', 465))
-    gmail_user: str = field(default_factory=lambda: os.getenv('EMAIL_GMAIL_USER', ''))
-    gmail_password: str = field(default_factory=lambda: os.getenv('EMAIL_GMAIL_PASSWORD', ''))
-    print_email: str = field(default_factory=lambda: os.getenv('EMAIL_PRINT_EMAIL', ''))
-    admin_email: str = field(default_factory=lambda: os.getenv('EMAIL_ADMIN_EMAIL', ''))
-    recipient_email: str = field(default_factory=lambda: os.getenv('RECIPIENT_EMAIL', ''))
+    gmail_user: str = field(default_factory=lambda: get_env('EMAIL_GMAIL_USER', ''))
+    gmail_password: str = field(default_factory=lambda: get_env('EMAIL_GMAIL_PASSWORD', ''))
+    print_email: str = field(default_factory=lambda: get_env('EMAIL_PRINT_EMAIL', ''))
+    admin_email: str = field(default_factory=lambda: get_env('EMAIL_ADMIN_EMAIL', ''))
+    recipient_email: str = field(default_factory=lambda: get_env('RECIPIENT_EMAIL', ''))
+    smtp_pool_size: int = field(default_factory=lambda: get_env_int('EMAIL_SMTP_POOL_SIZE', 5))
+    smtp_max_msgs_per_conn: int = field(default_factory=lambda: get_env_int('EMAIL_SMTP_MAX_MSGS_PER_CONN', 100))
 
-    def __post_init__(self):
-        if not self.gmail_user:
-            raise ValueError("EMAIL_GMAIL_USER environment variable is required")
-        if not self.gmail_password:
-            raise ValueError("EMAIL_GMAIL_PASSWORD environment variable is required")
-        if not self.print_email:
-            raise ValueError("EMAIL_PRINT_EMAIL environment variable is required")
-        if not self.admin_email:
-            raise ValueError("EMAIL_ADMIN_EMAIL environment variable is required")
-
-@dataclass
+@dataclass(frozen=True, eq=False)
 class ServiceConfig:
-    order_service_url: str = field(default_factory=lambda: os.getenv('ORDER_SERVICE_URL', 'http://localhost:5001'))
-    file_service_url: str = field(default_factory=lambda: os.getenv('FILE_SERVICE_URL', 'http://localhost:5002'))
-    email_service_url: str = field(default_factory=lambda: os.getenv('EMAIL_SERVICE_URL', 'http://localhost:5003'))
+    order_service_url: str = field(default_factory=lambda: get_env('ORDER_SERVICE_URL', 'http://localhost:5001'))
+    file_service_url: str = field(default_factory=lambda: get_env('FILE_SERVICE_URL', 'http://localhost:5002'))
+    email_service_url: str = field(default_factory=lambda: get_env('EMAIL_SERVICE_URL', 'http://localhost:5003'))
     orchestrator_port: int = field(default_factory=lambda: get_env_int('ORCHESTRATOR_PORT', 5000))
 
-@dataclass
+# Log directories already created by this process
+_ENSURED_LOG_DIRS = set()
+
+@dataclass(frozen=True, eq=False)
 class LoggingConfig:
-    log_dir: str = field(default_factory=lambda: os.getenv('LOG_DIR', '/var/log/microservice_mail'))
-    log_level: str = field(default_factory=lambda: os.getenv('LOG_LEVEL', 'INFO'))
-    log_format: str = field(default_factory=lambda: os.getenv('LOG_FORMAT', '%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    log_dir: str = field(default_factory=lambda: get_env('LOG_DIR', '/var/log/microservice_mail'))
+    log_level: str = field(default_factory=lambda: get_env('LOG_LEVEL', 'INFO'))
+    log_format: str = field(default_factory=lambda: get_env('LOG_FORMAT', '%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
 
     def __post_init__(self):
-        # Ensure log directory exists
-        Path(self.log_dir).mkdir(parents=True, exist_ok=True)
+        # Ensure log directory exists (once per directory per process)
+        if self.log_dir not in _ENSURED_LOG_DIRS:
+            Path(self.log_dir).mkdir(parents=True, exist_ok=True)
+            _ENSURED_LOG_DIRS.add(self.log_dir)
         
         # Validate log level
         valid_levels = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
         if self.log_level.upper() not in valid_levels:
             raise ValueError(f"LOG_LEVEL must be one of: {', '.join(valid_levels)}")
 
-@dataclass
+@dataclass(frozen=True, eq=False)
 class AppEnvironment:
-    environment: str = field(default_factory=lambda: os.getenv('ENVIRONMENT', 'development'))
+    environment: str = field(default_factory=lambda: get_env('ENVIRONMENT', 'development'))
     debug: bool = field(default_factory=lambda: get_env_bool('DEBUG', True))
 
     def __post_init__(self):
@@ -105,6 +141,16 @@ class AppEnvironment:
         if self.environment == 'production' and self.debug:
             logging.warning("DEBUG is enabled in production environment. Consider setting DEBUG=false")
 
+# Project root (parent of the shared directory); relative paths in the config are resolved against it
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+@functools.lru_cache(maxsize=32)
+def resolve_project_path(path: str) -> str:
+    """Return `path` as an absolute path, resolving relative paths from the project root."""
+    if os.path.isabs(path):
+        return path
+    return str(_PROJECT_ROOT / path)
+
 class AppConfig:
     """Main application configuration class that aggregates all config sections."""
     
@@ -115,6 +161,8 @@ class AppConfig:
         self.services = ServiceConfig()
         self.logging = LoggingConfig()
         self.environment = AppEnvironment()
+        # Resolved service account file, set once validate() has found it
+        self._service_account_path: Optional[str] = None
     
     @classmethod
     def from_env(cls):
@@ -133,21 +181,25 @@ class AppConfig:
     def validate(self) -> bool:
         """Validate the configuration."""
         try:
-            # Check if required files exist
-            service_account_file = self.google_drive.service_account_file
-            
-            # If path is relative, make it absolute from project root
-            if not os.path.isabs(service_account_file):
-                # Get the project root (parent of shared directory)
-                current_dir = os.path.dirname(os.path.abspath(__file__))
-                project_root = os.path.dirname(current_dir)
-                service_account_file = os.path.join(project_root, service_account_file)
-            
-            if not os.path.exists(service_account_file):
-                raise ValueError(f"Google Drive service account file not found: {service_account_file}")
+            # Check if required files exist; once found, later calls skip the stat
+            if self._service_account_path is None:
+                service_account_file = resolve_project_path(self.google_drive.service_account_file)
+                if not os.path.exists(service_account_file):
+                    raise ValueError(f"Google Drive service account file not found: {service_account_file}")
+                self._service_account_path = service_account_file
             
             logging.info("Configuration validation passed")
             return True
         except Exception as e:
             logging.error(f"Configuration validation failed: {e}")
-            return False
\ No newline at end of file
+            return False
+
+@functools.lru_cache(maxsize=1)
+def get_config() -> AppConfig:
+    """Get the process-wide configuration, loading it on first call."""
+    return AppConfig.from_env()
+
+def reset_config() -> None:
+    """Drop the cached configuration so the next get_config() reloads it (for tests)."""
+    refresh_env_cache()
+    get_config.cache_clear()
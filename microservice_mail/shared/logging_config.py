@@ -1,23 +1,43 @@
+import atexit
 import logging
 import logging.handlers
 import os
+import queue
 import sys
+import time
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
-from fastapi import FastAPI
 from .config import LoggingConfig
 
+if TYPE_CHECKING:
+    # Only for annotations: services that never set up FastAPI logging skip the import
+    from fastapi import FastAPI
+
 
 class LoggerSetup:
     """Centralized logging configuration for all microservices."""
     
+    # Background listeners that drain the per-logger queues into the real handlers
+    _listeners = []
+    
+    @staticmethod
+    def create_formatter(config: LoggingConfig) -> logging.Formatter:
+        """Formatter whose %(asctime)s is an ISO-8601 UTC timestamp with milliseconds."""
+        formatter = logging.Formatter(config.log_format)
+        formatter.converter = time.gmtime
+        formatter.default_time_format = "%Y-%m-%dT%H:%M:%S"
+        formatter.default_msec_format = "%s.%03dZ"
+        return formatter
+
     @staticmethod
     def setup_logger(
         name: str,
         config: LoggingConfig,
         log_file: Optional[str] = None,
-        console: bool = True
+        console: bool = True,
+        max_bytes: int = 10 * 1024 * 1024,
+        per_process: bool = False
     ) -> logging.Logger:
         """
         Setup a logger with both file and console handlers.
@@ -27,6 +47,9 @@ class LoggerSetup:
             config: LoggingConfig instance
             log_file: Optional specific log file name (defaults to {name}.log)
             console: Whether to add console handler
+            max_bytes: Size at which the log file is rotated
+            per_process: Suffix the file name with the PID; set when several worker
+                processes would otherwise rotate the same file independently
         
         Returns:
             Configured logger instance
@@ -37,39 +60,62 @@ class LoggerSetup:
         if logger.handlers:
             return logger
             
-        logger.setLevel(getattr(logging, config.log_level.upper()))
+        level = getattr(logging, config.log_level.upper())
+        logger.setLevel(level)
         
         # Create formatter
-        formatter = logging.Formatter(config.log_format)
+        formatter = LoggerSetup.create_formatter(config)
         
         # File handler
         if log_file is None:
             log_file = f"{name.replace('.', '_')}.log"
+        if per_process:
+            stem, ext = os.path.splitext(log_file)
+            log_file = f"{stem}.{os.getpid()}{ext}"
             
         log_path = Path(config.log_dir) / log_file
         log_path.parent.mkdir(parents=True, exist_ok=True)
         
         file_handler = logging.handlers.RotatingFileHandler(
             log_path,
-            maxBytes=10 * 1024 * 1024,  # 10MB
+            maxBytes=max_bytes,
             backupCount=5,
             encoding='utf-8'
         )
-        file_handler.setLevel(getattr(logging, config.log_level.upper()))
+        file_handler.setLevel(level)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers = [file_handler]
         
         # Console handler
         if console:
             console_handler = logging.StreamHandler(sys.stdout)
-            console_handler.setLevel(getattr(logging, config.log_level.upper()))
+            console_handler.setLevel(level)
             console_handler.setFormatter(formatter)
-            logger.addHandler(console_handler)
+            handlers.append(console_handler)
+        
+        # Log calls only enqueue the record; a listener thread does the actual I/O
+        log_queue = queue.SimpleQueue()
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        logger.propagate = False
+        
+        listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        LoggerSetup._listeners.append(listener)
         
         return logger
 
     @staticmethod
-    def setup_fastapi_logging(app: FastAPI, config: LoggingConfig, service_name: str):
+    def stop_listeners():
+        """Flush and stop all queue listeners (call on application shutdown)."""
+        while LoggerSetup._listeners:
+            listener = LoggerSetup._listeners.pop()
+            # QueueListener.stop() fails if called twice; the atexit hook is no longer needed
+            atexit.unregister(listener.stop)
+            listener.stop()
+
+    @staticmethod
+    def setup_fastapi_logging(app: "FastAPI", config: LoggingConfig, service_name: str):
         """Setup FastAPI application logging."""
         import uvicorn.logging
         
@@ -87,31 +133,42 @@ class LoggerSetup:
             "uvicorn"
         ]
         
+        # Level, formatter and handlers are the same for every uvicorn logger; build them once.
+        # A single file handler also keeps the three loggers from rotating the same file separately.
+        level = getattr(logging, config.log_level.upper())
+        formatter = LoggerSetup.create_formatter(config)
+        
+        # File handler for uvicorn logs
+        log_path = Path(config.log_dir) / f"uvicorn_{service_name}.log"
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_path,
+            maxBytes=10 * 1024 * 1024,  # 10MB
+            backupCount=5,
+            encoding='utf-8'
+        )
+        file_handler.setFormatter(formatter)
+        
+        # Console handler
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(formatter)
+        
+        # uvicorn.access logs every request; hand its records to a listener thread like setup_logger does
+        log_queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler)
+        listener.start()
+        atexit.register(listener.stop)
+        LoggerSetup._listeners.append(listener)
+        
         for logger_name in uvicorn_loggers:
             uvicorn_logger = logging.getLogger(logger_name)
             # Clear existing handlers
             uvicorn_logger.handlers.clear()
             
-            # Add our custom handlers
-            formatter = logging.Formatter(config.log_format)
-            
-            # File handler for uvicorn logs
-            log_path = Path(config.log_dir) / f"uvicorn_{service_name}.log"
-            file_handler = logging.handlers.RotatingFileHandler(
-                log_path,
-                maxBytes=10 * 1024 * 1024,  # 10MB
-                backupCount=5,
-                encoding='utf-8'
-            )
-            file_handler.setFormatter(formatter)
-            uvicorn_logger.addHandler(file_handler)
-            
-            # Console handler
-            console_handler = logging.StreamHandler(sys.stdout)
-            console_handler.setFormatter(formatter)
-            uvicorn_logger.addHandler(console_handler)
+            # Add our custom handler
+            uvicorn_logger.addHandler(queue_handler)
             
-            uvicorn_logger.setLevel(getattr(logging, config.log_level.upper()))
+            uvicorn_logger.setLevel(level)
             uvicorn_logger.propagate = False
         
         return logger
@@ -1,41 +1,65 @@
-from dataclasses import dataclass
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Literal, Optional
+
+from pydantic import BaseModel, ConfigDict
+
+# Serialized by pydantic-core (model_dump / model_dump_json) rather than field-by-field reflection
+class OrderData(BaseModel):
+    model_config = ConfigDict(frozen=True)
 
-@dataclass
-class OrderData:
     order_ids: List[str]
     files: List[str]
     quantities: Dict[str, int]
 
-@dataclass
-class FileData:
+class FileData(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     available_files: Dict[str, Any]
     missing_files: List[str]
     total_found: int
 
-@dataclass
-class EmailRequest:
+# Request bodies are validated by pydantic-core; unknown fields are rejected with a 422
+class EmailRequest(BaseModel):
+    model_config = ConfigDict(extra='forbid')
+
     to_email: str
     subject: str
     body: str
 
-@dataclass
-class PrintOrderEmailRequest:
+class PrintOrderEmailRequest(BaseModel):
+    model_config = ConfigDict(extra='forbid')
+
     files_data: OrderData
     available_files: Dict[str, Any]
     to_email: Optional[str] = None
     subject: Optional[str] = None
 
-@dataclass
-class MissingFilesEmailRequest:
+class MissingFilesEmailRequest(BaseModel):
+    model_config = ConfigDict(extra='forbid')
+
     order_ids: List[str]
     missing_files: List[str]
     quantities: Dict[str, int]
     to_email: Optional[str] = None
     subject: Optional[str] = None
 
-@dataclass
-class ServiceResponse:
+# /email/batch body sent by the orchestrator; ops carry only the fields their type uses
+class EmailBatchCommon(BaseModel):
+    order_ids: List[str]
+    quantities: Dict[str, int]
+
+class EmailBatchOp(BaseModel):
+    type: Literal['print-order', 'missing-files']
+    to_email: str
+    available_files: Optional[Dict[str, Any]] = None
+    missing_files: Optional[List[str]] = None
+
+class EmailBatchPayload(BaseModel):
+    common: EmailBatchCommon
+    ops: List[EmailBatchOp]
+
+class ServiceResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     success: bool
     data: Any = None
-    error: str = None
\ No newline at end of file
+    error: Optional[str] = None
@@ -0,0 +1,122 @@
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+import aiosmtplib
+
+logger = logging.getLogger(__name__)
+
+# Errors after which a connection cannot be reused
+CONNECTION_ERRORS = (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError, ConnectionError)
+
+# A timeout may leave a command (or a DATA phase) half-finished, so the session is out of
+# sync with the server too. Kept out of CONNECTION_ERRORS: callers must not blindly resend then.
+_BROKEN_SESSION_ERRORS = CONNECTION_ERRORS + (aiosmtplib.SMTPTimeoutError,)
+
+class _PooledConnection:
+    __slots__ = ("smtp", "msg_count", "last_used")
+
+    def __init__(self, smtp: aiosmtplib.SMTP):
+        self.smtp = smtp
+        self.msg_count = 0
+        self.last_used = time.monotonic()
+
+class SMTPConnectionPool:
+    """Bounded pool of logged-in aiosmtplib connections for one (host, port, user).
+
+    Connections are opened lazily and reused most-recently-used first, so a quiet
+    service keeps one warm connection while idle extras expire after `idle_ttl`.
+    A connection is retired after `max_msgs_per_conn` messages to stay under
+    per-session provider limits.
+    """
+
+    def __init__(self, host: str, port: int, user: str, password: str,
+                 max_size: int = 5, max_msgs_per_conn: int = 100,
+                 idle_ttl: float = 60.0, probe_after: float = 10.0):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.max_size = max_size
+        self.max_msgs_per_conn = max_msgs_per_conn
+        self.idle_ttl = idle_ttl
+        self.probe_after = probe_after
+
+        self._idle: List[_PooledConnection] = []
+        # Created on first lease so it binds to the running event loop (Python 3.9)
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def _connect(self) -> _PooledConnection:
+        smtp = aiosmtplib.SMTP(hostname=self.host, port=self.port, use_tls=True)
+        await smtp.connect()
+        await smtp.login(self.user, self.password)
+        return _PooledConnection(smtp)
+
+    async def _discard(self, conn: _PooledConnection) -> None:
+        try:
+            await conn.smtp.quit()
+        except (aiosmtplib.SMTPException, OSError):
+            pass
+
+    async def _acquire(self) -> _PooledConnection:
+        while self._idle:
+            conn = self._idle.pop()
+            idle_for = time.monotonic() - conn.last_used
+            if idle_for > self.idle_ttl:
+                await self._discard(conn)
+                continue
+            # Connections used moments ago skip the NOOP round trip; if the server
+            # dropped one anyway the send fails with a connection error and is retried
+            if idle_for < self.probe_after:
+                return conn
+            try:
+                await conn.smtp.noop()
+                return conn
+            except (aiosmtplib.SMTPException, OSError):
+                logger.info("Pooled SMTP connection went stale, reconnecting")
+                conn.smtp.close()
+        return await self._connect()
+
+    def _release(self, conn: _PooledConnection) -> None:
+        conn.last_used = time.monotonic()
+        self._idle.append(conn)
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[aiosmtplib.SMTP]:
+        """Borrow a logged-in connection; waits while `max_size` are already leased."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_size)
+        async with self._slots:
+            conn = await self._acquire()
+            try:
+                yield conn.smtp
+            except _BROKEN_SESSION_ERRORS:
+                # No QUIT: the server is gone or mid-command, so it would only wait out another timeout
+                conn.smtp.close()
+                raise
+            except Exception:
+                # e.g. a refused recipient: the session itself is still usable
+                self._release(conn)
+                raise
+            except BaseException:
+                # Cancelled mid-transaction: the session state is unknown, drop it
+                conn.smtp.close()
+                raise
+            conn.msg_count += 1
+            if conn.msg_count >= self.max_msgs_per_conn:
+                await self._discard(conn)
+            else:
+                self._release(conn)
+
+    async def warm(self) -> None:
+        """Open one connection ahead of time so the first send skips TLS and AUTH."""
+        if not self._idle:
+            self._release(await self._connect())
+
+    async def close(self) -> None:
+        """Quit every idle connection."""
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            await self._discard(conn)
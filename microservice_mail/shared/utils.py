@@ -1,23 +1,76 @@
+import asyncio
+import fcntl
 import functools
+import inspect
+import random
+import re
+import string
 import time
+from concurrent.futures import ThreadPoolExecutor
 import logging
-from typing import Any, Callable, Dict, Optional, TypeVar, Union
-from fastapi import HTTPException, Request
-from pydantic import BaseModel
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type, TypeVar, Union
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 T = TypeVar('T')
 
-def retry_on_failure(max_retries: int = 3, delay: float = 1.0, backoff: float = 2.0):
+# Transient failures retried by default: deterministic errors (TypeError, ValueError...) fail fast
+RETRYABLE_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    ConnectionError,
+    TimeoutError
+)
+
+# Response timestamps stay float seconds; time_ns() scaled by a multiply skips time.time()'s division
+_NS_TO_S = 1e-9
+
+# sanitize_filename's single translate pass: unsafe characters become '_', control characters are dropped
+_SANITIZE_TABLE = {ord(c): '_' for c in '<>:"/\\|?*'}
+_SANITIZE_TABLE.update({c: None for c in range(0x00, 0x20)})
+_SANITIZE_TABLE.update({c: None for c in range(0x7f, 0xa0)})
+
+# Allowed characters for validate_email's single pass, matching the former
+# ^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$ pattern
+_EMAIL_LOCAL_CHARS = frozenset(string.ascii_letters + string.digits + "._%+-")
+_EMAIL_DOMAIN_CHARS = frozenset(string.ascii_letters + string.digits + ".-")
+_EMAIL_TLD_CHARS = frozenset(string.ascii_letters)
+
+# One pooled session for safe_request, so repeated calls to a host reuse keep-alive connections.
+# Transient failures of idempotent requests are retried by the adapter.
+_SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(502, 503, 504))
+)
+_SESSION.mount('http://', _adapter)
+_SESSION.mount('https://', _adapter)
+
+def retry_on_failure(
+    max_retries: int = 3,
+    delay: float = 1.0,
+    backoff: float = 2.0,
+    retry_on: Tuple[Type[BaseException], ...] = RETRYABLE_ERRORS
+):
     """
     Retry decorator for functions that might fail temporarily.
     
+    Coroutine functions are handed to async_retry_on_failure, so backoff never
+    blocks the event loop with time.sleep.
+    
     Args:
         max_retries: Maximum number of retry attempts
         delay: Initial delay between retries in seconds
         backoff: Multiplier for delay after each retry
+        retry_on: Exception types worth retrying; anything else is raised at once
     """
     def decorator(func: Callable[..., T]) -> Callable[..., T]:
+        if inspect.iscoroutinefunction(func):
+            return async_retry_on_failure(max_retries, delay, backoff, retry_on)(func)
+        
         @functools.wraps(func)
         def wrapper(*args, **kwargs) -> T:
             current_delay = delay
@@ -26,13 +79,14 @@ def retry_on_failure(max_retries: int = 3, delay: float = 1.0, backoff: float =
             for attempt in range(max_retries + 1):
                 try:
                     return func(*args, **kwargs)
-                except Exception as e:
+                except retry_on as e:
                     last_exception = e
                     if attempt == max_retries:
                         break
                     
                     logging.warning(f"Attempt {attempt + 1}/{max_retries + 1} failed for {func.__name__}: {e}")
-                    time.sleep(current_delay)
+                    # Jitter keeps callers that failed together from retrying in lockstep
+                    time.sleep(current_delay * (0.5 + random.random()))
                     current_delay *= backoff
             
             logging.error(f"All retry attempts failed for {func.__name__}: {last_exception}")
@@ -42,41 +96,45 @@ def retry_on_failure(max_retries: int = 3, delay: float = 1.0, backoff: float =
     return decorator
 
 
-def validate_request_data(required_fields: list, optional_fields: list = None):
+def async_retry_on_failure(
+    max_retries: int = 3,
+    delay: float = 1.0,
+    backoff: float = 2.0,
+    retry_on: Tuple[Type[BaseException], ...] = RETRYABLE_ERRORS
+):
     """
-    FastAPI/Pydantic compatible request data validator.
-    This function is now mainly for legacy compatibility.
-    In FastAPI, use Pydantic models for validation instead.
+    Retry decorator for coroutines; waits with asyncio.sleep so the event loop stays free.
     
     Args:
-        required_fields: List of field names that must be present
-        optional_fields: List of field names that are optional
-    """
-    def validate_data(data: dict) -> dict:
-        if not data:
-            raise HTTPException(
-                status_code=400, 
-                detail="Request body cannot be empty"
-            )
-        
-        # Check required fields
-        missing_fields = [field for field in required_fields if field not in data or data[field] is None]
-        if missing_fields:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Missing required fields: {', '.join(missing_fields)}"
-            )
-        
-        # Check for unexpected fields if optional_fields is provided
-        if optional_fields is not None:
-            all_allowed = set(required_fields + optional_fields)
-            unexpected_fields = [field for field in data.keys() if field not in all_allowed]
-            if unexpected_fields:
-                logging.warning(f"Unexpected fields in request: {', '.join(unexpected_fields)}")
-        
-        return data
-    
-    return validate_data
+        max_retries: Maximum number of retry attempts
+        delay: Initial delay between retries in seconds
+        backoff: Multiplier for delay after each retry
+        retry_on: Exception types worth retrying; anything else is raised at once
+    """
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs) -> T:
+            current_delay = delay
+            last_exception = None
+            
+            for attempt in range(max_retries + 1):
+                try:
+                    return await func(*args, **kwargs)
+                except retry_on as e:
+                    last_exception = e
+                    if attempt == max_retries:
+                        break
+                    
+                    logging.warning(f"Attempt {attempt + 1}/{max_retries + 1} failed for {func.__name__}: {e}")
+                    # Jitter keeps callers that failed together from retrying in lockstep
+                    await asyncio.sleep(current_delay * (0.5 + random.random()))
+                    current_delay *= backoff
+            
+            logging.error(f"All retry attempts failed for {func.__name__}: {last_exception}")
+            raise last_exception
+            
+        return wrapper
+    return decorator
 
 
 def safe_request(url: str, method: str = 'GET', timeout: int = 30, **kwargs) -> Optional[requests.Response]:
@@ -93,7 +151,7 @@ def safe_request(url: str, method: str = 'GET', timeout: int = 30, **kwargs) ->
         Response object or None if request failed
     """
     try:
-        response = requests.request(method, url, timeout=timeout, **kwargs)
+        response = _SESSION.request(method, url, timeout=timeout, **kwargs)
         response.raise_for_status()
         return response
     except requests.exceptions.Timeout:
@@ -120,11 +178,8 @@ def sanitize_filename(filename: str) -> str:
     Returns:
         Sanitized filename
     """
-    import re
-    # Remove or replace unsafe characters
-    filename = re.sub(r'[<>:"/\\|?*]', '_', filename)
-    # Remove control characters
-    filename = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', filename)
+    # Replace unsafe characters and remove control characters
+    filename = filename.translate(_SANITIZE_TABLE)
     # Limit length
     if len(filename) > 255:
         name, ext = filename.rsplit('.', 1) if '.' in filename else (filename, '')
@@ -143,14 +198,77 @@ def validate_email(email: str) -> bool:
     Returns:
         True if email is valid, False otherwise
     """
-    import re
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return bool(re.match(pattern, email))
+    local, at, domain = email.partition('@')
+    if not local or not at:
+        return False
+    host, _, tld = domain.rpartition('.')
+    return (
+        bool(host)
+        and len(tld) >= 2
+        and _EMAIL_LOCAL_CHARS.issuperset(local)
+        and _EMAIL_DOMAIN_CHARS.issuperset(host)
+        and _EMAIL_TLD_CHARS.issuperset(tld)
+    )
+
+
+# Print format by filename tag, checked in order; the first match wins
+FORMAT_RULES = (
+    ("_b2", "format 50 x 70 cm"),
+    ("_45", "format 40x50 cm"),
+    ("_a3", "format 30x40 cm")
+)
+
+# One C-level scan over the filename for all tags; rule order still decides ties
+_FORMAT_TAG_RE = re.compile("|".join(re.escape(tag) for tag, _ in FORMAT_RULES))
+_FORMAT_PRIORITY = {tag: (i, info) for i, (tag, info) in enumerate(FORMAT_RULES)}
+
+
+@functools.lru_cache(maxsize=4096)
+def format_info(filename: str) -> str:
+    """
+    Get the print format described by a filename's size tag.
+    
+    Args:
+        filename: Filename, in any case
+        
+    Returns:
+        Format description, or an empty string if the name has no known tag
+    """
+    matches = [_FORMAT_PRIORITY[m.group()] for m in _FORMAT_TAG_RE.finditer(filename.lower())]
+    return min(matches)[1] if matches else ""
+
+
+class SharedCounter:
+    """Integer counter shared between worker processes through a locked file."""
+    
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.touch(exist_ok=True)
+    
+    def increment(self) -> int:
+        """Atomically add one and return the new value."""
+        with open(self.path, 'r+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            value = int(f.read() or 0) + 1
+            f.seek(0)
+            f.truncate()
+            f.write(str(value))
+            return value
+    
+    @property
+    def value(self) -> int:
+        with open(self.path, 'r') as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            return int(f.read() or 0)
 
 
 class HealthChecker:
     """Utility class for health checks."""
     
+    # Shared by the async checks so probes reuse pooled connections; created on first use
+    _async_client = None
+    
     @staticmethod
     def check_service(url: str, service_name: str) -> Dict[str, Any]:
         """
@@ -195,10 +313,76 @@ class HealthChecker:
         Returns:
             Dictionary with health check results for all services
         """
-        results = {}
-        for name, url in services.items():
-            results[name] = HealthChecker.check_service(url, name)
-        return results
+        if not services:
+            return {}
+        
+        # Probes are I/O-bound: run them side by side so the total is the slowest, not the sum
+        with ThreadPoolExecutor(max_workers=min(32, len(services))) as executor:
+            checks = executor.map(lambda item: HealthChecker.check_service(item[1], item[0]), services.items())
+            return dict(zip(services, checks))
+    
+    @classmethod
+    def _get_async_client(cls):
+        if cls._async_client is None:
+            import httpx  # only the async checks need it (pinned in the service requirements)
+            cls._async_client = httpx.AsyncClient(timeout=5)
+        return cls._async_client
+    
+    @staticmethod
+    async def check_service_async(url: str, service_name: str) -> Dict[str, Any]:
+        """
+        Check the health of a service without blocking the event loop.
+        
+        Args:
+            url: Service URL
+            service_name: Name of the service
+            
+        Returns:
+            Dictionary with health check results
+        """
+        try:
+            response = await HealthChecker._get_async_client().get(f"{url}/health")
+            if response.status_code == 200:
+                return {
+                    "service": service_name,
+                    "status": "healthy",
+                    "response_time": response.elapsed.total_seconds()
+                }
+            else:
+                return {
+                    "service": service_name,
+                    "status": "unhealthy",
+                    "error": "Health check failed or returned non-200 status"
+                }
+        except Exception as e:
+            return {
+                "service": service_name,
+                "status": "unhealthy",
+                "error": str(e)
+            }
+    
+    @staticmethod
+    async def check_all_services_async(services: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Check the health of multiple services concurrently on the event loop.
+        
+        Args:
+            services: Dictionary mapping service names to URLs
+            
+        Returns:
+            Dictionary with health check results for all services
+        """
+        checks = await asyncio.gather(
+            *(HealthChecker.check_service_async(url, name) for name, url in services.items())
+        )
+        return dict(zip(services, checks))
+    
+    @classmethod
+    async def close_async_client(cls) -> None:
+        """Close the shared async client (call on application shutdown)."""
+        if cls._async_client is not None:
+            await cls._async_client.aclose()
+            cls._async_client = None
 
 
 def format_error_response(message: str, error_code: str = None, details: Dict = None) -> Dict[str, Any]:
@@ -213,19 +397,13 @@ def format_error_response(message: str, error_code: str = None, details: Dict =
     Returns:
         Formatted error response
     """
-    response = {
+    return {
         "success": False,
         "error": message,
-        "timestamp": time.time()
+        "timestamp": time.time_ns() * _NS_TO_S,
+        **({"error_code": error_code} if error_code else {}),
+        **({"details": details} if details else {})
     }
-    
-    if error_code:
-        response["error_code"] = error_code
-        
-    if details:
-        response["details"] = details
-        
-    return response
 
 
 def format_success_response(data: Any = None, message: str = None) -> Dict[str, Any]:
@@ -239,15 +417,9 @@ def format_success_response(data: Any = None, message: str = None) -> Dict[str,
     Returns:
         Formatted success response
     """
-    response = {
+    return {
         "success": True,
-        "timestamp": time.time()
+        "timestamp": time.time_ns() * _NS_TO_S,
+        **({"data": data} if data is not None else {}),
+        **({"message": message} if message else {})
     }
-    
-    if data is not None:
-        response["data"] = data
-        
-    if message:
-        response["message"] = message
-        
-    return response